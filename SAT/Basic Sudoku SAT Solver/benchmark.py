@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+benchmark.py
+
+Solves a fixed sample of puzzles under several encodings, with and without a validity file added to
+the base formula, and records the solver statistics and the wall and CPU time of every puzzle. The
+records can be written to CSV or JSON (by the extension of the output file) and compared against such
+a file from an earlier run, e.g.
+
+    python3 benchmark.py -n 200 -o baseline.csv
+    python3 benchmark.py -n 200 -v 10000_15000_extended_batch_size_50_validities.txt -b baseline.csv
+"""
+
+import os
+import sys
+import csv
+import json
+import random
+import getopt
+import time
+
+import numpy as np
+
+from sudoku_sat_solver import ENCODINGS, STATISTICS, Usage, open_session, read_sudoku
+from puzzle_source import PuzzleSource
+from clause_library import load_clauses
+
+COLUMNS = ("encoding", "validities", "puzzle") + STATISTICS + ("wall", "cpu")
+MEASURES = STATISTICS + ("wall", "cpu")
+
+help_message = '''[options]
+Options:
+    -h --help               This help
+    -i --input file         Puzzle file (default: input.txt).
+    -n --sample n           Number of puzzles in the sample (default: 100).
+    --seed n                Seed for drawing the sample (default: 0).
+    -e --encodings names    Comma separated encodings (default: minimal,efficient,extended).
+    -v --validities file    Also run every encoding with the clauses of this file (text or clause
+                            library) added.
+    -s --solver name        Solver backend, see sudoku_sat_solver.py.
+    -o --output file        Write the records to a .csv or .json file.
+    -b --baseline file      Compare against the records of an earlier run.
+'''
+
+
+def sample_puzzles(filename, size, seed=0, exclude=None):
+    """
+    :param exclude: a (from, to) interval of lines to leave out, e.g. the puzzles trained on
+    :return: list of (line number, puzzle line); the same file, size and seed give the same sample
+    """
+    puzzles = PuzzleSource(filename)
+    try:
+        candidates = range(len(puzzles))
+        if exclude is not None:
+            candidates = [number for number in candidates if not exclude[0] <= number < exclude[1]]
+        numbers = sorted(random.Random(seed).sample(candidates, min(size, len(candidates))))
+        return [(number, puzzles.lines(number, number + 1)[0]) for number in numbers]
+    finally:
+        puzzles.close()
+
+
+def cpu_time():
+    # the minisat backend solves in child processes, so their time counts as well
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def run_configuration(encoding, validities_name, validities, sample, backend=None):
+    """
+    Every puzzle is solved on a fresh solver, so its record does not depend on the puzzles before it
+    in the sample; wall and cpu include loading the formula into that solver.
+
+    :return: one record per puzzle, a dict with the COLUMNS as keys
+    """
+    clauses, _ = ENCODINGS[encoding]
+    session = open_session(clauses(), backend)
+    if validities:
+        session.add_clauses(validities)
+    records = []
+    try:
+        for number, sudoku in sample:
+            units = [clause[0] for clause in read_sudoku(sudoku)]
+            start_wall, start_cpu = time.time(), cpu_time()
+            satisfied, _, _ = session.solve_fresh(units)
+            if not satisfied:
+                raise Exception("All sudokus should be satisfiable")
+            record = {"encoding": encoding, "validities": validities_name, "puzzle": number}
+            for key in STATISTICS:
+                record[key] = session.stats.get(key, 0)
+            record["wall"] = time.time() - start_wall
+            record["cpu"] = cpu_time() - start_cpu
+            records.append(record)
+    finally:
+        session.close()
+    return records
+
+
+def write_records(filename, records):
+    if filename.endswith(".json"):
+        with open(filename, "w") as fileobj:
+            json.dump(records, fileobj, indent=1)
+    else:
+        with open(filename, "w", newline="") as fileobj:
+            writer = csv.DictWriter(fileobj, COLUMNS)
+            writer.writeheader()
+            writer.writerows(records)
+
+
+def read_records(filename):
+    if filename.endswith(".json"):
+        with open(filename) as fileobj:
+            return json.load(fileobj)
+    with open(filename, newline="") as fileobj:
+        records = list(csv.DictReader(fileobj))
+    for record in records:
+        for key in ("puzzle",) + MEASURES:
+            record[key] = float(record[key])
+    return records
+
+
+def summarize(records):
+    """
+    :return: dict from (encoding, validities) to a dict from measure to (median, p95, mean)
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record["encoding"], record["validities"]), []).append(record)
+    summary = {}
+    for configuration, group in groups.items():
+        summary[configuration] = {}
+        for measure in MEASURES:
+            values = np.array([float(record[measure]) for record in group])
+            summary[configuration][measure] = (float(np.median(values)), float(np.percentile(values, 95)),
+                                               float(values.mean()))
+    return summary
+
+
+def change(new, old):
+    if not old:
+        return "n/a"
+    return "{:+.1f}%".format(100.0 * (new - old) / old)
+
+
+def report(records, baseline=None):
+    summary = summarize(records)
+    old_summary = summarize(baseline) if baseline else {}
+    counts = {}
+    for record in records:
+        configuration = (record["encoding"], record["validities"])
+        counts[configuration] = counts.get(configuration, 0) + 1
+    for configuration in sorted(summary):
+        print("encoding={}, validities={}, puzzles={}".format(configuration[0], configuration[1],
+                                                              counts[configuration]))
+        for measure in MEASURES:
+            median, p95, mean = summary[configuration][measure]
+            line = "  {:<13} median={:<12.6g} p95={:<12.6g} mean={:<12.6g}".format(measure, median, p95, mean)
+            if configuration in old_summary:
+                old_median, old_p95, _ = old_summary[configuration][measure]
+                line += " baseline median={:.6g} ({}) p95={:.6g} ({})".format(
+                    old_median, change(median, old_median), old_p95, change(p95, old_p95))
+            print(line)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    opts, args = getopt.getopt(argv[1:], "hi:n:e:v:s:o:b:",
+                               ["help", "input=", "sample=", "seed=", "encodings=", "validities=", "solver=",
+                                "output=", "baseline="])
+    filename = "input.txt"
+    size = 100
+    seed = 0
+    encodings = ["minimal", "efficient", "extended"]
+    validities_file = None
+    backend = None
+    output = None
+    baseline = None
+    for option, value in opts:
+        if option in ("-h", "--help"):
+            raise Usage(help_message)
+        if option in ("-i", "--input"):
+            filename = value
+        if option in ("-n", "--sample"):
+            size = int(value)
+        if option == "--seed":
+            seed = int(value)
+        if option in ("-e", "--encodings"):
+            encodings = value.split(",")
+            for encoding in encodings:
+                if encoding not in ENCODINGS:
+                    raise Usage("unknown encoding: {}".format(encoding))
+        if option in ("-v", "--validities"):
+            validities_file = value
+        if option in ("-s", "--solver"):
+            backend = value
+        if option in ("-o", "--output"):
+            output = value
+        if option in ("-b", "--baseline"):
+            baseline = read_records(value)
+
+    sample = sample_puzzles(filename, size, seed)
+    configurations = [("none", [])]
+    if validities_file:
+        configurations.append((os.path.basename(validities_file), load_clauses(validities_file)))
+    records = []
+    for encoding in encodings:
+        for validities_name, validities in configurations:
+            records.extend(run_configuration(encoding, validities_name, validities, sample, backend))
+    if output:
+        write_records(output, records)
+    report(records, baseline)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
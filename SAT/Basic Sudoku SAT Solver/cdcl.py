@@ -0,0 +1,490 @@
+"""
+cdcl.py
+
+A small conflict driven clause learning solver in pure Python, so that training does not depend on a
+patched minisat binary. It follows the MiniSat design: two watched literals, VSIDS branching, phase
+saving, Luby restarts, first-UIP clause learning and activity based learnt clause deletion. Every learnt
+clause is passed to a callback, which is what the patched minisat writes to its log as "clause_found".
+
+Literals are stored as integers 2 * variable + sign, all clauses live in one flat list of literals with
+an offset table, and all per-variable state is kept in flat lists indexed by variable or literal.
+"""
+
+import heapq
+
+VAR_DECAY = 0.95
+CLAUSE_DECAY = 0.999
+RESTART_FIRST = 100
+RESTART_INC = 2
+LEARNTSIZE_FACTOR = 1.0 / 3
+LEARNTSIZE_INC = 1.1
+
+
+def luby(y, x):
+    # finite subsequences of the Luby-sequence: 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+    size = 1
+    seq = 0
+    while size < x + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != x:
+        size = (size - 1) >> 1
+        seq -= 1
+        x = x % size
+    return y ** seq
+
+
+class Solver(object):
+    """
+    Incremental CDCL solver over DIMACS style integer literals.
+
+    solve() can be called any number of times with different assumptions; clauses added in between are
+    kept, and so are the clauses learnt so far, since they are implied by the permanent clauses alone.
+    After solve() returns True, model holds the signed literal of every variable; after it returns False,
+    core holds the assumptions that were used to derive the conflict (empty if the clauses are
+    unsatisfiable by themselves).
+    """
+
+    def __init__(self, clauses=(), nvars=0):
+        self.nvars = 0
+        self.ok = True
+        self.model = None
+        self.core = None
+        self.stats = {"restarts": 0, "conflicts": 0, "decisions": 0, "propagations": 0}
+        # clause arena
+        self._lits = []
+        self._start = []
+        self._size = []
+        self._activity = []
+        self._learnt = []
+        self._learnts = []
+        self._clause_inc = 1.0
+        self._max_learnts = 0.0
+        # per literal state
+        self._values = [0, 0]
+        self._watches = [[], []]
+        # per variable state
+        self._level = [0]
+        self._reason = [-1]
+        self._polarity = [1]
+        self._seen = [0]
+        self._var_activity = [0.0]
+        self._var_inc = 1.0
+        self._order = []
+        # assignment trail
+        self._trail = []
+        self._trail_lim = []
+        self._qhead = 0
+        self.ensure_vars(nvars)
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def ensure_vars(self, nvars):
+        while self.nvars < nvars:
+            self.nvars += 1
+            self._values.extend((0, 0))
+            self._watches.extend(([], []))
+            self._level.append(0)
+            self._reason.append(-1)
+            # like MiniSat, branch on the negative literal first
+            self._polarity.append(1)
+            self._seen.append(0)
+            self._var_activity.append(0.0)
+            heapq.heappush(self._order, (-0.0, self.nvars))
+
+    def _literal(self, literal):
+        variable = abs(literal)
+        if variable > self.nvars:
+            self.ensure_vars(variable)
+        return 2 * variable + (literal < 0)
+
+    @staticmethod
+    def _external(literal):
+        return -(literal >> 1) if literal & 1 else literal >> 1
+
+    def add_clause(self, clause):
+        """
+        Adds a permanent clause. Returns False once the clauses are known to be unsatisfiable.
+        """
+        if not self.ok:
+            return False
+        self._cancel_until(0)
+        values = self._values
+        lits = []
+        for literal in set(self._literal(int(x)) for x in clause):
+            if values[literal] == 1 or literal ^ 1 in lits:
+                # satisfied at the top level or a tautology
+                return True
+            if values[literal] == 0:
+                lits.append(literal)
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self._assign(lits[0], -1)
+            self.ok = self._propagate() < 0
+        else:
+            self._attach(lits, False)
+        return self.ok
+
+    def _attach(self, lits, learnt):
+        ref = len(self._start)
+        self._start.append(len(self._lits))
+        self._size.append(len(lits))
+        self._activity.append(0.0)
+        self._learnt.append(learnt)
+        self._lits.extend(lits)
+        self._watches[lits[0]].append(ref)
+        self._watches[lits[1]].append(ref)
+        if learnt:
+            self._learnts.append(ref)
+        return ref
+
+    def _assign(self, literal, reason):
+        variable = literal >> 1
+        self._values[literal] = 1
+        self._values[literal ^ 1] = -1
+        self._level[variable] = len(self._trail_lim)
+        self._reason[variable] = reason
+        self._trail.append(literal)
+
+    def _cancel_until(self, level):
+        if len(self._trail_lim) <= level:
+            return
+        values = self._values
+        polarity = self._polarity
+        activity = self._var_activity
+        order = self._order
+        trail = self._trail
+        for index in range(len(trail) - 1, self._trail_lim[level] - 1, -1):
+            literal = trail[index]
+            variable = literal >> 1
+            values[literal] = 0
+            values[literal ^ 1] = 0
+            polarity[variable] = literal & 1
+            heapq.heappush(order, (-activity[variable], variable))
+        del trail[self._trail_lim[level]:]
+        del self._trail_lim[level:]
+        self._qhead = len(trail)
+        if len(order) > 8 * self.nvars + 1000:
+            # get rid of the stale entries of the lazy heap
+            self._order = [(-activity[v], v) for v in range(1, self.nvars + 1) if values[2 * v] == 0]
+            heapq.heapify(self._order)
+
+    def _propagate(self):
+        """
+        Unit propagation over the watch lists. Returns the conflicting clause or -1.
+        """
+        lits = self._lits
+        start = self._start
+        size = self._size
+        values = self._values
+        watches = self._watches
+        trail = self._trail
+        level = len(self._trail_lim)
+        levels = self._level
+        reasons = self._reason
+        conflict = -1
+        qhead = self._qhead
+        propagations = 0
+        while qhead < len(trail):
+            false_literal = trail[qhead] ^ 1
+            qhead += 1
+            propagations += 1
+            watchers = watches[false_literal]
+            i = j = 0
+            n = len(watchers)
+            while i < n:
+                ref = watchers[i]
+                i += 1
+                s = start[ref]
+                # make sure the false literal is the second watch
+                first = lits[s]
+                if first == false_literal:
+                    first = lits[s + 1]
+                    lits[s] = first
+                    lits[s + 1] = false_literal
+                if values[first] == 1:
+                    watchers[j] = ref
+                    j += 1
+                    continue
+                # look for a new literal to watch
+                for k in range(s + 2, s + size[ref]):
+                    literal = lits[k]
+                    if values[literal] != -1:
+                        lits[s + 1] = literal
+                        lits[k] = false_literal
+                        watches[literal].append(ref)
+                        break
+                else:
+                    watchers[j] = ref
+                    j += 1
+                    if values[first] == -1:
+                        conflict = ref
+                        while i < n:
+                            watchers[j] = watchers[i]
+                            i += 1
+                            j += 1
+                        qhead = len(trail)
+                    else:
+                        variable = first >> 1
+                        values[first] = 1
+                        values[first ^ 1] = -1
+                        levels[variable] = level
+                        reasons[variable] = ref
+                        trail.append(first)
+            del watchers[j:]
+        self._qhead = qhead
+        self.stats["propagations"] += propagations
+        return conflict
+
+    def _bump_variable(self, variable):
+        activity = self._var_activity
+        activity[variable] += self._var_inc
+        if activity[variable] > 1e100:
+            for v in range(1, self.nvars + 1):
+                activity[v] *= 1e-100
+            self._var_inc *= 1e-100
+            self._order = [(-activity[v], v) for v in range(1, self.nvars + 1) if self._values[2 * v] == 0]
+            heapq.heapify(self._order)
+        elif self._values[2 * variable] == 0:
+            heapq.heappush(self._order, (-activity[variable], variable))
+
+    def _bump_clause(self, ref):
+        activity = self._activity
+        activity[ref] += self._clause_inc
+        if activity[ref] > 1e20:
+            for learnt in self._learnts:
+                activity[learnt] *= 1e-20
+            self._clause_inc *= 1e-20
+
+    def _analyze(self, conflict):
+        """
+        First UIP conflict analysis. Returns the learnt clause, asserting literal first, and the level
+        to backjump to.
+        """
+        lits = self._lits
+        start = self._start
+        size = self._size
+        seen = self._seen
+        levels = self._level
+        reasons = self._reason
+        trail = self._trail
+        current = len(self._trail_lim)
+        learnt = [0]
+        paths = 0
+        literal = -1
+        index = len(trail) - 1
+        while True:
+            if self._learnt[conflict]:
+                self._bump_clause(conflict)
+            s = start[conflict]
+            for k in range(s if literal < 0 else s + 1, s + size[conflict]):
+                q = lits[k]
+                variable = q >> 1
+                if not seen[variable] and levels[variable] > 0:
+                    self._bump_variable(variable)
+                    seen[variable] = 1
+                    if levels[variable] >= current:
+                        paths += 1
+                    else:
+                        learnt.append(q)
+            while not seen[trail[index] >> 1]:
+                index -= 1
+            literal = trail[index]
+            index -= 1
+            conflict = reasons[literal >> 1]
+            seen[literal >> 1] = 0
+            paths -= 1
+            if paths == 0:
+                break
+        learnt[0] = literal ^ 1
+
+        # drop literals whose reason is entirely contained in the clause
+        minimised = [learnt[0]]
+        for q in learnt[1:]:
+            reason = reasons[q >> 1]
+            if reason < 0:
+                minimised.append(q)
+                continue
+            s = start[reason]
+            for k in range(s + 1, s + size[reason]):
+                variable = lits[k] >> 1
+                if not seen[variable] and levels[variable] > 0:
+                    minimised.append(q)
+                    break
+        for q in learnt:
+            seen[q >> 1] = 0
+
+        backjump = 0
+        if len(minimised) > 1:
+            best = 1
+            for k in range(2, len(minimised)):
+                if levels[minimised[k] >> 1] > levels[minimised[best] >> 1]:
+                    best = k
+            minimised[1], minimised[best] = minimised[best], minimised[1]
+            backjump = levels[minimised[1] >> 1]
+        return minimised, backjump
+
+    def _analyze_final(self, literal):
+        """
+        Collects the assumptions that force the assumption literal to be false.
+        """
+        core = [self._external(literal)]
+        if not self._trail_lim:
+            return core
+        seen = self._seen
+        seen[literal >> 1] = 1
+        lits = self._lits
+        start = self._start
+        size = self._size
+        for index in range(len(self._trail) - 1, self._trail_lim[0] - 1, -1):
+            q = self._trail[index]
+            variable = q >> 1
+            if seen[variable]:
+                reason = self._reason[variable]
+                if reason < 0:
+                    core.append(self._external(q))
+                else:
+                    s = start[reason]
+                    for k in range(s + 1, s + size[reason]):
+                        if self._level[lits[k] >> 1] > 0:
+                            seen[lits[k] >> 1] = 1
+                seen[variable] = 0
+        seen[literal >> 1] = 0
+        return core
+
+    def _reduce_db(self):
+        """
+        Removes the less active half of the learnt clauses, keeping binary clauses and reasons, and
+        compacts the arena.
+        """
+        start = self._start
+        lits = self._lits
+        limit = self._clause_inc / max(len(self._learnts), 1)
+        self._learnts.sort(key=lambda ref: (self._size[ref] > 2, self._activity[ref]))
+        keep = []
+        half = len(self._learnts) // 2
+        for position, ref in enumerate(self._learnts):
+            first = lits[start[ref]]
+            locked = self._reason[first >> 1] == ref and self._values[first] == 1
+            if self._size[ref] > 2 and not locked and (position < half or self._activity[ref] < limit):
+                start[ref] = -1
+            else:
+                keep.append(ref)
+        self._learnts = keep
+        self._compact()
+
+    def _compact(self):
+        """
+        Moves the clauses that are not deleted to the front of the arena and renumbers them in the watch
+        lists, the reasons and the learnt list.
+        """
+        renumber = [-1] * len(self._start)
+        lits = []
+        start = []
+        size = []
+        activity = []
+        learnt = []
+        for ref, s in enumerate(self._start):
+            if s < 0:
+                continue
+            renumber[ref] = len(start)
+            start.append(len(lits))
+            lits.extend(self._lits[s:s + self._size[ref]])
+            size.append(self._size[ref])
+            activity.append(self._activity[ref])
+            learnt.append(self._learnt[ref])
+        self._lits = lits
+        self._start = start
+        self._size = size
+        self._activity = activity
+        self._learnt = learnt
+        self._watches = [[renumber[ref] for ref in watchers if renumber[ref] >= 0] for watchers in self._watches]
+        # the reasons of unassigned variables may name deleted clauses, they are never read again
+        self._reason = [renumber[ref] if ref >= 0 else -1 for ref in self._reason]
+        self._learnts = [renumber[ref] for ref in self._learnts]
+
+    def _pick_branch(self):
+        order = self._order
+        values = self._values
+        activity = self._var_activity
+        while order:
+            priority, variable = heapq.heappop(order)
+            if values[2 * variable] == 0 and -priority == activity[variable]:
+                return 2 * variable + self._polarity[variable]
+        return -1
+
+    def _search(self, budget, assumptions, on_learnt):
+        conflicts = 0
+        while True:
+            conflict = self._propagate()
+            if conflict >= 0:
+                conflicts += 1
+                self.stats["conflicts"] += 1
+                if not self._trail_lim:
+                    self.ok = False
+                    self.core = []
+                    return False
+                learnt, backjump = self._analyze(conflict)
+                self._cancel_until(backjump)
+                if on_learnt is not None:
+                    on_learnt([self._external(literal) for literal in learnt])
+                if len(learnt) == 1:
+                    self._assign(learnt[0], -1)
+                else:
+                    ref = self._attach(learnt, True)
+                    self._bump_clause(ref)
+                    self._assign(learnt[0], ref)
+                self._var_inc /= VAR_DECAY
+                self._clause_inc /= CLAUSE_DECAY
+            else:
+                if conflicts >= budget:
+                    self._cancel_until(0)
+                    return None
+                if len(self._learnts) - len(self._trail) >= self._max_learnts:
+                    self._reduce_db()
+                    self._max_learnts *= LEARNTSIZE_INC
+                decision = -1
+                while len(self._trail_lim) < len(assumptions):
+                    literal = assumptions[len(self._trail_lim)]
+                    if self._values[literal] == 1:
+                        # already true, open a dummy decision level
+                        self._trail_lim.append(len(self._trail))
+                    elif self._values[literal] == -1:
+                        self.core = self._analyze_final(literal)
+                        return False
+                    else:
+                        decision = literal
+                        break
+                if decision < 0:
+                    decision = self._pick_branch()
+                    if decision < 0:
+                        self.model = [v if self._values[2 * v] == 1 else -v for v in range(1, self.nvars + 1)]
+                        return True
+                    self.stats["decisions"] += 1
+                self._trail_lim.append(len(self._trail))
+                self._assign(decision, -1)
+
+    def solve(self, assumptions=(), on_learnt=None):
+        """
+        :param assumptions: literals that are assumed true for this call only
+        :param on_learnt: called with every learnt clause as a list of literals
+        :return: True if satisfiable under the assumptions
+        """
+        self.model = None
+        self.core = None
+        if not self.ok:
+            self.core = []
+            return False
+        assumptions = [self._literal(int(x)) for x in assumptions]
+        # relative to the permanent clauses, as in MiniSat; the arena holds no deleted clauses
+        self._max_learnts = max((len(self._start) - len(self._learnts)) * LEARNTSIZE_FACTOR, 100)
+        restarts = 0
+        status = None
+        while status is None:
+            budget = luby(RESTART_INC, restarts) * RESTART_FIRST
+            status = self._search(budget, assumptions, on_learnt)
+            restarts += 1
+            self.stats["restarts"] += 1
+        self._cancel_until(0)
+        return status
@@ -0,0 +1,72 @@
+"""
+checkpoint.py
+
+Checkpoints of a training run, written after every batch so that a run that stops halfway can be
+continued with --resume. A checkpoint holds the number of batches done, the known solutions, the
+validities found so far, running totals, and the settings of the run, so that it is not resumed with a
+different interval, batch count or encoding. It is written to a temporary file that replaces the old
+checkpoint only once it is complete, so a crash while writing leaves the previous checkpoint intact.
+
+The base formula is not stored: it is the encoding plus the validities, so resuming adds the stored
+validities to the sessions again.
+"""
+
+import os
+import json
+
+import numpy as np
+
+from clause_arrays import SolutionMatrix, ClauseSet
+
+
+def checkpoint_name(interval_from, interval_to, encoding, batch_size):
+    return "_".join([str(interval_from), str(interval_to), encoding, "batch_size", str(batch_size),
+                     "checkpoint.npz"])
+
+
+def save_checkpoint(filename, batches_done, solutions, validities, totals, settings, counts=None):
+    """
+    :param batches_done: the number of batches finished, the batch to continue with
+    :param solutions: a SolutionMatrix
+    :param validities: a ClauseSet
+    :param totals: dict of running totals, anything JSON can store
+    :param settings: dict identifying the run, compared on resume
+    :param counts: the CountMinSketch of heuristic pruning, if any
+    """
+    literals, offsets = validities.arrays()
+    sketch = {}
+    if counts is not None:
+        sketch = {"sketch": counts.table, "sketch_puzzles": np.int64(counts.puzzles)}
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as fileobj:
+        np.savez(fileobj,
+                 batches_done=np.int64(batches_done),
+                 solutions=np.packbits(solutions.matrix, axis=1),
+                 shape=np.array(solutions.matrix.shape, dtype=np.int64),
+                 literals=literals,
+                 offsets=offsets,
+                 totals=np.array(json.dumps(totals)),
+                 settings=np.array(json.dumps(settings, sort_keys=True)),
+                 **sketch)
+        fileobj.flush()
+        os.fsync(fileobj.fileno())
+    os.replace(temporary, filename)
+
+
+def load_checkpoint(filename, settings, counts=None):
+    """
+    :param counts: a CountMinSketch that gets the counts stored in the checkpoint
+    :return: batches_done, solutions, validities and totals as passed to save_checkpoint
+    :raise ValueError: if the checkpoint was written with other settings
+    """
+    with np.load(filename) as data:
+        if json.loads(str(data["settings"])) != json.loads(json.dumps(settings)):
+            raise ValueError("{} was written by a run with the settings {}".format(filename, str(data["settings"])))
+        rows, columns = data["shape"].tolist()
+        solutions = SolutionMatrix()
+        solutions.matrix = np.unpackbits(data["solutions"], axis=1, count=columns).astype(bool).reshape(rows, columns)
+        validities = ClauseSet.from_arrays(data["literals"], data["offsets"])
+        if counts is not None and "sketch" in data and data["sketch"].shape == counts.table.shape:
+            counts.table[:] = data["sketch"]
+            counts.puzzles = int(data["sketch_puzzles"])
+        return int(data["batches_done"]), solutions, validities, json.loads(str(data["totals"]))
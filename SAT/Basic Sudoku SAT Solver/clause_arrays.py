@@ -0,0 +1,238 @@
+"""
+clause_arrays.py
+
+NumPy representations of clauses and solutions for bulk checks. A set of solutions becomes a dense
+boolean matrix with one row per solution and one column per variable, and a list of clauses becomes
+padded arrays of variable indices and signs, so checking every clause against every solution is a
+gather and two reductions instead of three nested Python loops. The gather works on the matrix with
+the solutions packed into bits, eight solutions per byte.
+
+ClauseSet is the container for the clauses a training run collects (learnt clauses, solutions and
+validities): the literals of all clauses in one int16 array instead of a frozenset of Python ints
+per clause.
+
+Usable on its own, e.g. to see which clauses of a validity file are refuted by known solutions:
+
+    clauses = read_clauses("10000_15000_minimal_batch_size_50_validities.txt")
+    refuted = [c for c, ok in zip(clauses, SolutionMatrix(solutions).satisfied_by_all(clauses)) if not ok]
+"""
+
+import numpy as np
+
+# upper bound on the number of booleans gathered at once
+CHUNK_CELLS = 1 << 25
+
+
+def read_clauses(filename):
+    """
+    :return: the clauses of a validity file (one clause per line, space separated) as frozensets of ints
+    """
+    with open(filename) as fileobj:
+        return [frozenset(int(x) for x in line.split()) for line in fileobj if line.strip()]
+
+
+def padded_literals(clauses):
+    """
+    :param clauses: list of clauses or a ClauseSet
+    :return: variables, an int32 array with one row per clause padded with 0, positive, true where the
+             literal is positive, and mask, true where there is a literal at all
+    """
+    if isinstance(clauses, ClauseSet):
+        literals = clauses.padded()
+    else:
+        clauses = [list(clause) for clause in clauses]
+        width = max([len(clause) for clause in clauses] + [1])
+        literals = np.zeros((len(clauses), width), dtype=np.int32)
+        for row, clause in enumerate(clauses):
+            literals[row, :len(clause)] = clause
+    return np.abs(literals), literals > 0, literals != 0
+
+
+class ClauseSet(object):
+    """
+    A set of clauses stored as one growing array of literals plus the offsets where the clauses start.
+
+    Clauses are kept with their literals sorted and are deduplicated through a dictionary from the hash
+    of the sorted literals to the clause's position, so a clause costs two bytes per literal, eight for
+    its offset and one dictionary entry. Literals are int16 until a variable does not fit, then the
+    array is widened to int32. Supports add, update, |, in, len and iteration, which yields frozensets
+    in insertion order, so it can stand in for a set of frozensets.
+    """
+
+    def __init__(self, clauses=()):
+        self._literals = np.zeros(1024, dtype=np.int16)
+        self._offsets = np.zeros(256, dtype=np.int64)
+        self._count = 0
+        self._buckets = {}
+        self.update(clauses)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        return self._offsets[self._count] * self._literals.itemsize + (self._count + 1) * 8
+
+    def _find(self, key, literals):
+        # the positions with this hash are an int, or a tuple of ints for colliding clauses
+        found = self._buckets.get(key)
+        if found is None:
+            return None
+        for position in (found if isinstance(found, tuple) else (found,)):
+            if self._clause(position) == literals:
+                return position
+        return None
+
+    def _clause(self, position):
+        return self._literals[self._offsets[position]:self._offsets[position + 1]].tolist()
+
+    def _append(self, literals):
+        start = int(self._offsets[self._count])
+        end = start + len(literals)
+        if literals and max(literals[-1], -literals[0]) > np.iinfo(self._literals.dtype).max:
+            self._literals = self._literals.astype(np.int32)
+        if end > len(self._literals):
+            self._literals = np.resize(self._literals, max(end, 2 * len(self._literals)))
+        if self._count + 2 > len(self._offsets):
+            self._offsets = np.resize(self._offsets, 2 * len(self._offsets))
+        self._literals[start:end] = literals
+        self._count += 1
+        self._offsets[self._count] = end
+
+    def add(self, clause):
+        """
+        :return: True if the clause was not in the set yet
+        """
+        literals = sorted(int(literal) for literal in clause)
+        key = hash(tuple(literals))
+        if self._find(key, literals) is not None:
+            return False
+        found = self._buckets.get(key)
+        if found is None:
+            self._buckets[key] = self._count
+        else:
+            self._buckets[key] = (found if isinstance(found, tuple) else (found,)) + (self._count,)
+        self._append(literals)
+        return True
+
+    def update(self, clauses):
+        for clause in clauses:
+            self.add(clause)
+
+    def __contains__(self, clause):
+        literals = sorted(int(literal) for literal in clause)
+        return self._find(hash(tuple(literals)), literals) is not None
+
+    def __iter__(self):
+        literals = self._literals[:self._offsets[self._count]].tolist()
+        offsets = self._offsets[:self._count + 1].tolist()
+        for k in range(self._count):
+            yield frozenset(literals[offsets[k]:offsets[k + 1]])
+
+    @classmethod
+    def from_arrays(cls, literals, offsets):
+        """
+        :return: the ClauseSet with the clauses literals[offsets[k]:offsets[k + 1]], as returned by arrays()
+        """
+        literals = np.asarray(literals).tolist()
+        offsets = np.asarray(offsets).tolist()
+        return cls(literals[offsets[k]:offsets[k + 1]] for k in range(len(offsets) - 1))
+
+    def arrays(self):
+        """
+        :return: copies of the literals and of the clause offsets
+        """
+        return self._literals[:self._offsets[self._count]].copy(), self._offsets[:self._count + 1].copy()
+
+    def copy(self):
+        other = ClauseSet()
+        other._literals = self._literals.copy()
+        other._offsets = self._offsets.copy()
+        other._count = self._count
+        other._buckets = dict(self._buckets)
+        return other
+
+    def __or__(self, clauses):
+        union = self.copy()
+        union.update(clauses)
+        return union
+
+    def lengths(self):
+        return np.diff(self._offsets[:self._count + 1])
+
+    def padded(self):
+        """
+        :return: int32 array with the literals of one clause per row, padded with 0
+        """
+        lengths = self.lengths()
+        width = int(lengths.max()) if self._count else 1
+        literals = np.zeros((self._count, max(width, 1)), dtype=np.int32)
+        rows = np.repeat(np.arange(self._count), lengths)
+        columns = np.arange(len(rows)) - np.repeat(self._offsets[:self._count], lengths)
+        literals[rows, columns] = self._literals[:len(rows)]
+        return literals
+
+
+class SolutionMatrix(object):
+    """
+    Known solutions as a boolean matrix, matrix[s, x] being the value of variable x in solution s.
+
+    Column 0 is unused so that variables index the columns directly. Rows can be added with update(),
+    so a training run keeps one matrix across batches instead of converting all solutions every time.
+    """
+
+    def __init__(self, solutions=()):
+        self.matrix = np.zeros((0, 1), dtype=bool)
+        self._packed = None
+        self.update(solutions)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def update(self, solutions):
+        solutions = [[literal for literal in solution if literal > 0] for solution in solutions]
+        if not solutions:
+            return
+        width = max([self.matrix.shape[1]] + [max(solution) + 1 for solution in solutions if solution])
+        rows = np.zeros((len(solutions), width), dtype=bool)
+        for row, positives in enumerate(solutions):
+            rows[row, positives] = True
+        if width > self.matrix.shape[1]:
+            self.matrix = np.pad(self.matrix, ((0, 0), (0, width - self.matrix.shape[1])))
+        self.matrix = np.concatenate((self.matrix, rows))
+        self._packed = None
+
+    def packed(self):
+        """
+        :return: uint8 array with one row per variable holding its values in all solutions as bits
+        """
+        if self._packed is None:
+            self._packed = np.packbits(self.matrix.T, axis=1)
+        return self._packed
+
+    def satisfied_by_all(self, clauses):
+        """
+        :param clauses: list of clauses
+        :return: boolean array, true for the clauses that every solution satisfies
+        """
+        if not isinstance(clauses, ClauseSet):
+            clauses = list(clauses)
+        if not len(clauses):
+            return np.zeros(0, dtype=bool)
+        variables, positive, mask = padded_literals(clauses)
+        packed = self.packed()
+        # variables the solutions do not mention are false in all of them
+        if variables.max() >= packed.shape[0]:
+            packed = np.pad(packed, ((0, int(variables.max()) + 1 - packed.shape[0]), (0, 0)))
+        # a clause is satisfied by all solutions if the bits of its true literals cover all of them
+        everything = np.packbits(np.ones(len(self), dtype=bool))
+        flip = np.where(positive, 0, 0xFF).astype(np.uint8)
+        keep = np.where(mask, 0xFF, 0).astype(np.uint8)
+        result = np.empty(len(clauses), dtype=bool)
+        step = max(1, CHUNK_CELLS // max(1, packed.shape[1] * variables.shape[1]))
+        for start in range(0, len(clauses), step):
+            chunk = slice(start, start + step)
+            values = (packed[variables[chunk]] ^ flip[chunk, :, None]) & keep[chunk, :, None]
+            covered = np.bitwise_or.reduce(values, axis=1)
+            result[chunk] = ((covered & everything) == everything).all(axis=1)
+        return result
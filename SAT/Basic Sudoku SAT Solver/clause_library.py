@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+clause_library.py
+
+A binary file format for sets of clauses, such as validity files and precomputed encodings, that is
+memory-mapped instead of parsed. The layout, all little endian:
+
+    header    64 bytes: the magic b"SATCLIB\\0", the format version, the literal width in bytes (2 or
+              4), the number of variables and the number of clauses as uint32, the encoding name as
+              32 bytes of zero padded ASCII and 8 reserved bytes
+    offsets   uint32[clauses + 1], clause k is literals[offsets[k]:offsets[k + 1]]
+    literals  int16[offsets[-1]], int32 if a variable does not fit into int16
+
+Converts from and to the text format of the *_validities.txt files (one clause per line, space
+separated literals), or writes the clauses of an encoding:
+
+    python3 clause_library.py -e minimal 10000_15000_minimal_batch_size_50_validities.txt minimal.clauses
+    python3 clause_library.py minimal.clauses minimal_validities.txt
+    python3 clause_library.py -e extended extended.clauses
+"""
+
+import sys
+import mmap
+import struct
+import getopt
+
+import numpy as np
+
+from clause_arrays import ClauseSet, read_clauses
+from sudoku_encodings import ClauseBlock
+
+MAGIC = b"SATCLIB\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIII32s8x")
+
+help_message = '''[options] [text file] library file
+       [options] library file text file
+Options:
+    -h --help               This help
+    -e --encoding name      The encoding the clauses belong to, stored in the header. Without a text
+                            file the clauses of this encoding are written.
+'''
+
+
+def is_library(filename):
+    with open(filename, "rb") as fileobj:
+        return fileobj.read(len(MAGIC)) == MAGIC
+
+
+def write_library(filename, clauses, encoding="", number_of_variables=None):
+    """
+    :param clauses: a ClauseSet or an iterable of clauses
+    :param encoding: the name of the encoding the clauses belong to, at most 32 characters
+    :param number_of_variables: by default the largest variable of the clauses
+    """
+    if isinstance(clauses, ClauseSet):
+        literals, offsets = clauses.arrays()
+    else:
+        clauses = [sorted(int(x) for x in clause) for clause in clauses]
+        offsets = np.cumsum([0] + [len(clause) for clause in clauses])
+        literals = np.array([x for clause in clauses for x in clause], dtype=np.int32)
+    largest = int(np.abs(literals).max()) if len(literals) else 0
+    if number_of_variables is None:
+        number_of_variables = largest
+    dtype = np.int16 if largest <= np.iinfo(np.int16).max else np.int32
+    header = HEADER.pack(MAGIC, VERSION, np.dtype(dtype).itemsize, number_of_variables, len(offsets) - 1,
+                         encoding.encode("ascii"))
+    with open(filename, "wb") as fileobj:
+        fileobj.write(header)
+        fileobj.write(np.asarray(offsets, dtype="<u4").tobytes())
+        fileobj.write(np.asarray(literals, dtype=np.dtype(dtype).newbyteorder("<")).tobytes())
+
+
+class ClauseLibrary(object):
+    """
+    A clause library file, memory-mapped. offsets and literals are read-only arrays on the mapping, so
+    opening a library costs the same whatever its size; clauses are only decoded when iterated. Views
+    returned by library[k] have to be dropped before close().
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._fileobj = open(filename, "rb")
+        data = self._fileobj.read(HEADER.size)
+        if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+            self._fileobj.close()
+            raise ValueError("{} is not a clause library".format(filename))
+        _, version, width, self.number_of_variables, count, encoding = HEADER.unpack(data)
+        if version != VERSION:
+            self._fileobj.close()
+            raise ValueError("{} has clause library version {}, expected {}".format(filename, version, VERSION))
+        self.encoding = encoding.rstrip(b"\0").decode("ascii")
+        self._data = mmap.mmap(self._fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = np.frombuffer(self._data, dtype="<u4", count=count + 1, offset=HEADER.size)
+        self.literals = np.frombuffer(self._data, dtype="<i{}".format(width), count=int(self.offsets[-1]),
+                                      offset=HEADER.size + self.offsets.nbytes)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        return self.literals[self.offsets[k]:self.offsets[k + 1]]
+
+    def __iter__(self):
+        literals = self.literals.tolist()
+        offsets = self.offsets.tolist()
+        for k in range(len(offsets) - 1):
+            yield frozenset(literals[offsets[k]:offsets[k + 1]])
+
+    def clause_set(self):
+        return ClauseSet.from_arrays(self.literals, self.offsets)
+
+    def block(self):
+        """
+        :return: a ClauseBlock with copies of the arrays, which stays usable after close()
+        """
+        # np.array copies even where the dtype already matches, the mapping is gone after close()
+        return ClauseBlock(np.array(self.literals, dtype=np.int32), np.array(self.offsets, dtype=np.int64))
+
+    def close(self):
+        # the arrays are views on the mapping and have to go first
+        self.offsets = self.literals = None
+        self._data.close()
+        self._fileobj.close()
+
+
+def load_clauses(filename, encoding=None):
+    """
+    Reads a clause library or a text file of clauses. The literals of a library are copied as whole
+    arrays, no clause is decoded on its own; sessions and dimacs_body take the ClauseBlock as it is.
+
+    :param encoding: if given, a library written for another encoding is refused
+    :return: a ClauseBlock from sudoku_encodings
+    """
+    if not is_library(filename):
+        return ClauseBlock.from_clauses(read_clauses(filename))
+    library = ClauseLibrary(filename)
+    try:
+        if encoding is not None and library.encoding and library.encoding != encoding:
+            raise ValueError("{} holds clauses of the {} encoding, not {}".format(filename, library.encoding,
+                                                                                 encoding))
+        return library.block()
+    finally:
+        library.close()
+
+
+def text_to_library(text_file, library_file, encoding=""):
+    write_library(library_file, read_clauses(text_file), encoding)
+
+
+def library_to_text(library_file, text_file):
+    library = ClauseLibrary(library_file)
+    try:
+        with open(text_file, "w") as fileobj:
+            literals = library.literals.tolist()
+            offsets = library.offsets.tolist()
+            for k in range(len(library)):
+                fileobj.write(" ".join(str(x) for x in literals[offsets[k]:offsets[k + 1]]) + "\n")
+    finally:
+        library.close()
+
+
+def main(argv=None):
+    # imported here, sudoku_sat_solver loads its validities through this module
+    from sudoku_sat_solver import ENCODINGS, Usage
+    if argv is None:
+        argv = sys.argv
+    opts, args = getopt.getopt(argv[1:], "he:", ["help", "encoding="])
+    encoding = ""
+    for option, value in opts:
+        if option in ("-h", "--help"):
+            raise Usage(help_message)
+        if option in ("-e", "--encoding"):
+            encoding = value
+    if len(args) == 1 and encoding:
+        if encoding not in ENCODINGS:
+            raise Usage("unknown encoding: {}".format(encoding))
+        write_library(args[0], ENCODINGS[encoding][0](), encoding)
+    elif len(args) == 2 and is_library(args[0]):
+        library_to_text(args[0], args[1])
+    elif len(args) == 2:
+        text_to_library(args[0], args[1], encoding)
+    else:
+        raise Usage(help_message)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
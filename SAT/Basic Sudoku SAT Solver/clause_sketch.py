@@ -0,0 +1,59 @@
+"""
+clause_sketch.py
+
+Approximate counts of how often clauses are learnt, in a fixed amount of memory. A count-min sketch
+keeps depth rows of width counters; a clause increments one counter per row, chosen by a
+multiply-shift hash of its sorted literals, and its count is the smallest of those counters. Counts are
+never too low and are too high by at most a small fraction of the total with high probability, which
+is what deciding "learnt in at least x puzzles" needs.
+"""
+
+import numpy as np
+
+# odd 64 bit multipliers, one per row
+MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+               0xA0761D6478BD642F, 0xE7037ED1A0B428DB, 0x8EBC6AF09C88C6E3, 0x589965CC75374CC3)
+
+
+def clause_keys(clauses):
+    """
+    :return: uint64 array with a hash of the sorted literals of every clause
+    """
+    keys = [hash(tuple(sorted(clause))) & 0xFFFFFFFFFFFFFFFF for clause in clauses]
+    return np.array(keys, dtype=np.uint64)
+
+
+class CountMinSketch(object):
+    """
+    :param bits: the rows have 2 ** bits counters
+    :param depth: the number of rows, at most len(MULTIPLIERS)
+    """
+
+    def __init__(self, bits=18, depth=4):
+        self.bits = bits
+        self.table = np.zeros((depth, 1 << bits), dtype=np.int32)
+        self.puzzles = 0
+
+    def _columns(self, keys):
+        shift = np.uint64(64 - self.bits)
+        return [(keys * np.uint64(multiplier)) >> shift for multiplier in MULTIPLIERS[:len(self.table)]]
+
+    def update(self, clauses):
+        """
+        Counts every clause once; pass the clauses learnt on one puzzle to count puzzles per clause.
+        """
+        keys = clause_keys(clauses)
+        if not len(keys):
+            return
+        for row, columns in zip(self.table, self._columns(keys)):
+            np.add.at(row, columns.astype(np.int64), 1)
+
+    def counts(self, clauses):
+        """
+        :return: int array with an upper bound of the count of every clause
+        """
+        keys = clause_keys(clauses)
+        if not len(keys):
+            return np.zeros(0, dtype=np.int32)
+        return np.min([row[columns.astype(np.int64)] for row, columns in zip(self.table, self._columns(keys))],
+                      axis=0)
@@ -0,0 +1,61 @@
+"""
+metrics.py
+
+Counters and stage timers for the training pipeline. The solver code counts into the module level
+METRICS object (solver calls per purpose, DIMACS bytes, clauses in and out of every pruning step) and
+main times its stages with METRICS.stage(name). After each batch emit() writes everything collected
+since the previous event as one JSON line to the file given to open(), then starts over, e.g.
+
+    {"event": "batch", "batch": 0, "stages": {"solve": 1.2, ...}, "counters": {"calls.solve": 50, ...}}
+
+Only the main process counts: work done inside SessionPool workers shows up in the stage timers and
+in the counters main keeps for the mapped queries, not in counters incremented by the workers.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self._fileobj = None
+
+    def open(self, filename):
+        self._fileobj = open(filename, "a")
+
+    @contextmanager
+    def stage(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.time() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def emit(self, event, **fields):
+        """
+        Writes the timers and counters collected since the last event, plus the given fields, and resets them.
+        """
+        if self._fileobj is not None:
+            record = {"event": event, "time": time.time()}
+            record.update(fields)
+            record["stages"] = self.timers
+            record["counters"] = self.counters
+            self._fileobj.write(json.dumps(record, sort_keys=True) + "\n")
+            self._fileobj.flush()
+        self.timers = {}
+        self.counters = {}
+
+    def close(self):
+        if self._fileobj is not None:
+            self._fileobj.close()
+            self._fileobj = None
+
+
+METRICS = Metrics()
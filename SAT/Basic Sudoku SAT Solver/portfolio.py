@@ -0,0 +1,148 @@
+"""
+portfolio.py
+
+Races several configurations on every puzzle and takes the first answer. A configuration is an
+encoding with or without a validity file added to it, written encoding or encoding+file, e.g.
+
+    --portfolio minimal,extended,extended+10000_15000_extended_batch_size_50_validities.txt
+
+No configuration is fastest on every puzzle, so the time per puzzle is the time of whichever one is
+fastest on it. Each configuration keeps its session, with the base formula loaded, in the main
+process. A puzzle is solved by forking one child per configuration, which solves on its copy of the
+session. The first child to answer wins and the others are killed together with their process
+group, so a minisat run started by a losing child is stopped as well. The winner of every puzzle is
+printed and counted, so that configurations which never win can be dropped from the portfolio.
+"""
+
+import os
+import time
+import shutil
+import signal
+import tempfile
+import multiprocessing
+import multiprocessing.connection
+
+from clause_library import load_clauses
+from metrics import METRICS
+from sudoku_sat_solver import ENCODINGS, Usage, open_session, read_sudoku
+
+
+def parse_portfolio(spec):
+    """
+    :param spec: comma separated configurations, encoding or encoding+validity file
+    :return: list of (name, encoding, validity file or None)
+    """
+    configurations = []
+    for name in spec.split(","):
+        encoding, _, validities_file = name.partition("+")
+        if encoding not in ENCODINGS:
+            raise Usage("unknown encoding in portfolio: {}".format(encoding))
+        configurations.append((name, encoding, validities_file or None))
+    if not configurations:
+        raise Usage("empty portfolio")
+    return configurations
+
+
+def _race(session, units, writer):
+    # runs in the forked child, in a process group of its own
+    os.setsid()
+    satisfied, solution, _ = session.solve(units)
+    writer.send((satisfied, solution, session.stats))
+
+
+class Portfolio(object):
+    """
+    :param configurations: as returned by parse_portfolio
+    :param backend: the solver backend of every configuration, see open_session
+    """
+
+    def __init__(self, configurations, backend=None, simplify=False):
+        self.names = []
+        self.sessions = []
+        self.workdirs = []
+        for name, encoding, validities_file in configurations:
+            clauses, _ = ENCODINGS[encoding]
+            workdir = tempfile.mkdtemp(prefix="sudoku_portfolio_")
+            session = open_session(clauses(), backend, workdir=workdir, simplify=simplify)
+            if validities_file:
+                try:
+                    session.add_clauses(load_clauses(validities_file, encoding))
+                except ValueError as err:
+                    raise Usage(str(err))
+            self.names.append(name)
+            self.sessions.append(session)
+            self.workdirs.append(workdir)
+        self.wins = dict.fromkeys(self.names, 0)
+        self._context = multiprocessing.get_context("fork")
+
+    def solve(self, sudoku):
+        """
+        :return: the name of the winning configuration, its solution and statistics, and the seconds it took
+        """
+        start = time.time()
+        units = [clause[0] for clause in read_sudoku(sudoku)]
+        racers = {}
+        for name, session in zip(self.names, self.sessions):
+            reader, writer = self._context.Pipe(duplex=False)
+            process = self._context.Process(target=_race, args=(session, units, writer))
+            process.start()
+            writer.close()
+            racers[reader] = (name, process)
+        result = None
+        try:
+            while racers and result is None:
+                for reader in multiprocessing.connection.wait(list(racers)):
+                    name, process = racers.pop(reader)
+                    try:
+                        satisfied, solution, stats = reader.recv()
+                    except EOFError:
+                        # the child died without an answer, the others may still give one
+                        process.join()
+                        continue
+                    finally:
+                        reader.close()
+                    process.join()
+                    result = name, satisfied, solution, stats
+                    break
+        finally:
+            for reader, (name, process) in racers.items():
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    # not yet in its own group, or gone already
+                    process.kill()
+                process.join()
+                reader.close()
+        if result is None:
+            raise Exception("No configuration of the portfolio solved the sudoku")
+        name, satisfied, solution, stats = result
+        if not satisfied:
+            raise Exception("All sudokus should be satisfiable")
+        self.wins[name] += 1
+        METRICS.count("portfolio.wins." + name)
+        return name, solution, stats, time.time() - start
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+        for workdir in self.workdirs:
+            shutil.rmtree(workdir, True)
+
+
+def race_sudokus(list_of_sudokus, portfolio):
+    """
+    Solves the puzzles one at a time on the portfolio and prints the winner of each.
+
+    :return: the solutions and the number of decisions the winners took
+    """
+    solutions = []
+    no_decisions = 0
+    for number, sudoku in enumerate(list_of_sudokus):
+        name, solution, stats, seconds = portfolio.solve(sudoku)
+        print("portfolio: puzzle={}, winner={}, time={:.4f}, decisions={}".format(number, name, seconds,
+                                                                                   stats.get("decisions", 0)))
+        solutions.append(solution)
+        no_decisions += stats.get("decisions", 0)
+    print("portfolio wins: {}".format(", ".join("{}={}".format(name, portfolio.wins[name])
+                                                for name in portfolio.names)))
+    return solutions, no_decisions
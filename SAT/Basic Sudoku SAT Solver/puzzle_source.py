@@ -0,0 +1,79 @@
+"""
+puzzle_source.py
+
+Puzzle files read lazily. The file is memory-mapped and indexed by the byte offsets at which its
+lines start, so an interval of puzzles is sliced out without reading, splitting or holding the lines
+before it, and a batch only decodes its own lines. Building the index is a single NumPy scan for
+newlines; it can be saved next to the corpus and is reused as long as the file has the same size
+and modification time.
+"""
+
+import os
+import mmap
+
+import numpy as np
+
+
+def line_offsets(data):
+    """
+    :param data: buffer with the contents of a text file
+    :return: int64 array with the offset of every line start, followed by the end of the data
+    """
+    size = len(data)
+    if not size:
+        return np.zeros(1, dtype=np.int64)
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")).astype(np.int64)
+    ends = newlines + 1
+    if not len(ends) or ends[-1] != size:
+        # the last line has no newline
+        ends = np.append(ends, size)
+    return np.concatenate(([0], ends))
+
+
+class PuzzleSource(object):
+    """
+    The lines of a puzzle file, one puzzle per line, with len() and lines(start, stop).
+
+    :param index_file: where to keep the offsets between runs, in .npy format whatever the name; built in
+                       memory if None
+    """
+
+    def __init__(self, filename, index_file=None):
+        self.filename = filename
+        self._fileobj = open(filename, "rb")
+        status = os.fstat(self._fileobj.fileno())
+        self._data = b""
+        if status.st_size:
+            self._data = mmap.mmap(self._fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        # the index starts with the size and modification time of the file it was built for
+        stamp = np.array([status.st_size, status.st_mtime_ns], dtype=np.int64)
+        self.offsets = None
+        if index_file is not None and os.path.exists(index_file):
+            saved = np.load(index_file)
+            if len(saved) > 2 and (saved[:2] == stamp).all():
+                self.offsets = saved[2:]
+        if self.offsets is None:
+            self.offsets = line_offsets(self._data)
+            if index_file is not None:
+                # through a file object, np.save would add .npy to a path without it
+                with open(index_file, "wb") as fileobj:
+                    np.save(fileobj, np.concatenate((stamp, self.offsets)))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lines(self, start, stop):
+        """
+        :return: the lines start to stop (clamped like a slice) as strings, including their newlines
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return []
+        offsets = self.offsets[start:stop + 1].tolist()
+        data = self._data
+        return [data[offsets[k]:offsets[k + 1]].decode() for k in range(len(offsets) - 1)]
+
+    def close(self):
+        if self._data:
+            self._data.close()
+        self._fileobj.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+select_validities.py
+
+Searches for the part of a validity file that, added to the base formula, solves a held-out sample
+of puzzles with the fewest mean decisions (or the least mean wall time). Adding every validity does
+not always pay off, since more clauses also make propagation slower.
+
+The validities are grouped by their classify_validities category and their length, e.g. new/2 or
+urow/2. Forward selection starts from no groups and adds the group that helps most while one does;
+backward elimination (ablation) starts from all groups and removes the group whose removal helps
+most while one does. The candidates of every step are evaluated in parallel on -j processes. The
+clauses of the best subset are written as a new validity file, e.g.
+
+    python3 select_validities.py -v 10000_15000_minimal_batch_size_50_validities.txt -e minimal \\
+        -n 200 -x 10000:15000 -j 4 -o 10000_15000_minimal_selected_validities.txt
+"""
+
+import sys
+import getopt
+import multiprocessing
+
+import numpy as np
+
+from sudoku_sat_solver import ENCODINGS, Usage, classify_validities, write_clauses
+from benchmark import sample_puzzles, run_configuration
+from clause_library import load_clauses
+
+MEASURES = ("decisions", "wall")
+
+help_message = '''[options]
+Options:
+    -h --help               This help
+    -v --validities file    The validities to select from (text or clause library).
+    -i --input file         Puzzle file of the held-out sample (default: input.txt).
+    -n --sample n           Number of puzzles in the sample (default: 100).
+    --seed n                Seed for drawing the sample (default: 0).
+    -x --exclude from:to    Leave these lines of the puzzle file, e.g. the training interval, out of the sample.
+    -e --encoding name      The encoding the validities belong to (default: extended).
+    -s --solver name        Solver backend, see sudoku_sat_solver.py.
+    -m --measure name       decisions (default) or wall.
+    --method name           forward (default) or backward.
+    -j --jobs n             Evaluate the candidates of a step on n processes.
+    -o --output file        Write the selected validities to this file.
+'''
+
+
+def validity_groups(encoding, validities):
+    """
+    :return: dict from group name, category/length, to the list of its clauses; a clause that
+             classify_validities puts into several categories goes to the first
+    """
+    _, clauses_with_cats = ENCODINGS[encoding]
+    groups = {}
+    seen = set()
+    for category, members in classify_validities(clauses_with_cats(), validities).items():
+        for clause, _ in members:
+            if clause not in seen:
+                seen.add(clause)
+                groups.setdefault("{}/{}".format(category, len(clause)), []).append(clause)
+    return groups
+
+
+def _evaluate(args):
+    encoding, clauses, sample, backend, measure = args
+    # a fresh solver per puzzle, see run_configuration, so the score only depends on the clauses
+    records = run_configuration(encoding, "candidate", clauses, sample, backend)
+    return float(np.mean([record[measure] for record in records]))
+
+
+class Evaluator(object):
+    """
+    Mean measure over the sample for subsets of the groups, several subsets at a time. Every subset is
+    evaluated on the same puzzles in the same order, each puzzle on a fresh solver.
+    """
+
+    def __init__(self, encoding, groups, sample, backend=None, measure="decisions", jobs=1):
+        self.encoding = encoding
+        self.groups = groups
+        self.sample = sorted(sample)
+        self.backend = backend
+        self.measure = measure
+        self.evaluations = 0
+        self._pool = multiprocessing.get_context("fork").Pool(jobs) if jobs > 1 else None
+
+    def clauses(self, names):
+        return [clause for name in sorted(names) for clause in self.groups[name]]
+
+    def __call__(self, subsets):
+        tasks = [(self.encoding, self.clauses(names), self.sample, self.backend, self.measure)
+                 for names in subsets]
+        self.evaluations += len(tasks)
+        if self._pool is None:
+            return [_evaluate(task) for task in tasks]
+        return self._pool.map(_evaluate, tasks)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+
+
+def select(names, evaluate, forward=True):
+    """
+    Greedy forward selection or backward elimination over the groups.
+
+    :return: the selected group names and their score
+    """
+    selected = [] if forward else list(names)
+    best = evaluate([selected])[0]
+    print("start: groups={}, score={:.3f}".format(len(selected), best))
+    while True:
+        options = [name for name in names if (name in selected) != forward]
+        if not options:
+            break
+        if forward:
+            candidates = [selected + [name] for name in options]
+        else:
+            candidates = [[other for other in selected if other != name] for name in options]
+        scores = evaluate(candidates)
+        score, step = min(zip(scores, options))
+        print("  {}: {}".format("add" if forward else "remove",
+                                ", ".join("{}={:.3f}".format(name, score) for name, score in zip(options, scores))))
+        if score >= best:
+            break
+        selected = candidates[options.index(step)]
+        best = score
+        print("{} {}: groups={}, score={:.3f}".format("added" if forward else "removed", step, len(selected), best))
+    return selected, best
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    opts, args = getopt.getopt(argv[1:], "hv:i:n:x:e:s:m:j:o:",
+                               ["help", "validities=", "input=", "sample=", "seed=", "exclude=", "encoding=",
+                                "solver=", "measure=", "method=", "jobs=", "output="])
+    validities_file = None
+    filename = "input.txt"
+    size = 100
+    seed = 0
+    exclude = None
+    encoding = "extended"
+    backend = None
+    measure = "decisions"
+    forward = True
+    jobs = 1
+    output = None
+    for option, value in opts:
+        if option in ("-h", "--help"):
+            raise Usage(help_message)
+        if option in ("-v", "--validities"):
+            validities_file = value
+        if option in ("-i", "--input"):
+            filename = value
+        if option in ("-n", "--sample"):
+            size = int(value)
+        if option == "--seed":
+            seed = int(value)
+        if option in ("-x", "--exclude"):
+            exclude = tuple(int(x) for x in value.split(":"))
+        if option in ("-e", "--encoding"):
+            if value not in ENCODINGS:
+                raise Usage("unknown encoding: {}".format(value))
+            encoding = value
+        if option in ("-s", "--solver"):
+            backend = value
+        if option in ("-m", "--measure"):
+            if value not in MEASURES:
+                raise Usage("unknown measure: {}".format(value))
+            measure = value
+        if option == "--method":
+            if value not in ("forward", "backward"):
+                raise Usage("unknown method: {}".format(value))
+            forward = value == "forward"
+        if option in ("-j", "--jobs"):
+            jobs = int(value)
+        if option in ("-o", "--output"):
+            output = value
+    if validities_file is None:
+        raise Usage(help_message)
+
+    try:
+        # classified and grouped as sets
+        validities = [frozenset(clause) for clause in load_clauses(validities_file, encoding)]
+    except ValueError as err:
+        raise Usage(str(err))
+    groups = validity_groups(encoding, validities)
+    print("groups: {}".format(", ".join("{}={}".format(name, len(groups[name])) for name in sorted(groups))))
+    sample = sample_puzzles(filename, size, seed, exclude)
+    evaluate = Evaluator(encoding, groups, sample, backend, measure, jobs)
+    try:
+        full = evaluate([list(groups)])[0]
+        selected, best = select(sorted(groups), evaluate, forward)
+    finally:
+        evaluate.close()
+    clauses = evaluate.clauses(selected)
+    print("selected: {}".format(", ".join(sorted(selected)) or "none"))
+    print("mean {}: all validities={:.3f}, selected={:.3f} ({} of {} clauses), evaluations={}".format(
+        measure, full, best, len(clauses), len(validities), evaluate.evaluations))
+    if output:
+        write_clauses(output, clauses)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
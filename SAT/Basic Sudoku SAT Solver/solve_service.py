@@ -0,0 +1,131 @@
+"""
+solve_service.py
+
+Solves puzzles as they come in, on one session that keeps the encoding and validities loaded, so a
+caller that wants one answer does not pay for building the base formula. Requests are lines of 81
+characters, 1 to 9 for the givens and 0 or . for the empty cells, read from stdin or from the
+connections to a Unix socket. Connections are served on threads of their own, the solver itself
+answers one request at a time. Every request gets one line back:
+
+    <the 81 digits of the solution> decisions=12 conflicts=3 propagations=810 restarts=0 ms=1.9
+    unsat ms=0.8
+    error <what is wrong with the request>
+
+Every REPORT_EVERY requests, and when the service stops, a line with the throughput and the median
+and 99th percentile latency over the last WINDOW requests goes to stderr.
+"""
+
+import os
+import sys
+import stat
+import time
+import signal
+import threading
+import collections
+import socketserver
+
+import numpy as np
+
+from metrics import METRICS
+from sudoku_sat_solver import STATISTICS, read_sudoku
+
+REPORT_EVERY = 100
+WINDOW = 1000
+CELLS = 81
+CHARACTERS = frozenset("0123456789.")
+
+
+def solution_line(solution):
+    """
+    :return: the 81 digits of the grid that the true v(i, j, d) of a solution describe
+    """
+    digits = ["0"] * CELLS
+    for literal in solution:
+        if 0 < literal <= 9 * CELLS:
+            digits[(literal - 1) // 9] = str((literal - 1) % 9 + 1)
+    return "".join(digits)
+
+
+class SolveService(object):
+
+    def __init__(self, session, report=sys.stderr):
+        self.session = session
+        self.report_file = report
+        self.served = 0
+        self.window = collections.deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+
+    def answer(self, line):
+        """
+        :param line: one request
+        :return: the response line, without the newline
+        """
+        start = time.time()
+        puzzle = line.strip()
+        if len(puzzle) != CELLS or not CHARACTERS.issuperset(puzzle):
+            return "error expected 81 characters 0-9 or ., got {!r}".format(puzzle[:100])
+        units = [clause[0] for clause in read_sudoku(puzzle.replace(".", "0"))]
+        with self._lock:
+            satisfied, solution, _ = self.session.solve(units)
+            stats = self.session.stats
+            latency = time.time() - start
+            self.served += 1
+            self.window.append((start, latency))
+            METRICS.count("calls.serve")
+            if self.served % REPORT_EVERY == 0:
+                self.report()
+        if not satisfied:
+            return "unsat ms={:.1f}".format(1000 * latency)
+        fields = ["{}={}".format(key, stats.get(key, 0)) for key in STATISTICS]
+        return "{} {} ms={:.1f}".format(solution_line(solution), " ".join(sorted(fields)), 1000 * latency)
+
+    def report(self):
+        if not self.window:
+            return
+        latencies = np.array([latency for _, latency in self.window])
+        first_start = self.window[0][0]
+        last_end = self.window[-1][0] + self.window[-1][1]
+        throughput = len(self.window) / max(last_end - first_start, 1e-9)
+        self.report_file.write("served={}, throughput={:.1f}/s, p50={:.2f}ms, p99={:.2f}ms\n".format(
+            self.served, throughput, 1000 * np.percentile(latencies, 50), 1000 * np.percentile(latencies, 99)))
+        self.report_file.flush()
+
+    def serve_stream(self, infile, outfile):
+        for line in infile:
+            if not line.strip():
+                continue
+            outfile.write(self.answer(line) + "\n")
+            outfile.flush()
+        self.report()
+
+    def serve_socket(self, path):
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    for line in self.rfile:
+                        line = line.decode("ascii", "replace")
+                        if line.strip():
+                            self.wfile.write((service.answer(line) + "\n").encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client went away without reading its answer
+                    pass
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            # left behind by a service that was killed
+            os.remove(path)
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(path)
+            self.report()
@@ -0,0 +1,200 @@
+"""
+sudoku_encodings.py
+
+The minimal, efficient and extended Sudoku encodings for any box order n, that is for a grid of
+n*n by n*n cells with the digits 1 to n*n. For n = 3 they produce exactly the clauses of
+minimal_sudoku_clauses, sudoku_clauses and extended_sudoku_clauses in sudoku_sat_solver.py, in the
+same order, but they are built with NumPy so that 16x16, 25x25 and 36x36 grids with millions of
+clauses can be generated in a fraction of a second.
+
+Clauses are kept in a ClauseBlock: one flat array with the literals of all clauses and an array of
+offsets where the clauses start.
+"""
+
+import numpy as np
+
+
+class ClauseBlock(object):
+    """
+    A list of clauses stored as a flat int32 array of literals plus clause offsets.
+
+    Clause k consists of literals[offsets[k]:offsets[k + 1]]. Iterating yields the clauses as lists of
+    Python ints, so a block can be used wherever a list of clauses is expected.
+    """
+
+    def __init__(self, literals, offsets):
+        self.literals = np.asarray(literals, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        # every row of the matrix is one clause
+        matrix = np.asarray(matrix, dtype=np.int32)
+        rows, width = matrix.shape
+        return cls(matrix.reshape(-1), np.arange(rows + 1, dtype=np.int64) * width)
+
+    @classmethod
+    def from_clauses(cls, clauses):
+        clauses = [[int(x) for x in clause] for clause in clauses]
+        lengths = np.array([len(clause) for clause in clauses], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        return cls([x for clause in clauses for x in clause], offsets)
+
+    @classmethod
+    def concatenate(cls, blocks):
+        blocks = list(blocks)
+        literals = np.concatenate([block.literals for block in blocks])
+        offsets = [np.zeros(1, dtype=np.int64)]
+        shift = 0
+        for block in blocks:
+            offsets.append(block.offsets[1:] + shift)
+            shift += len(block.literals)
+        return cls(literals, np.concatenate(offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        literals = self.literals.tolist()
+        offsets = self.offsets.tolist()
+        for k in range(len(offsets) - 1):
+            yield literals[offsets[k]:offsets[k + 1]]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def number_of_variables(self):
+        if not len(self.literals):
+            return 0
+        return int(np.abs(self.literals).max())
+
+    def dimacs(self):
+        """
+        :return: the clauses as DIMACS bytes, without a header
+        """
+        # put a 0 behind every clause and let a single join format all literals
+        terminated = np.insert(self.literals, self.offsets[1:], 0)
+        text = " ".join(map(str, terminated.tolist()))
+        return (text.replace(" 0 ", " 0\n") + "\n").encode()
+
+
+def variables(n):
+    """
+    :return: the array V with V[i - 1, j - 1, d - 1] == v(i, j, d) for box order n
+    """
+    size = n * n
+    return np.arange(1, size ** 3 + 1, dtype=np.int32).reshape(size, size, size)
+
+
+def v(i, j, d, n=3):
+    size = n * n
+    return size * size * (i - 1) + size * (j - 1) + d
+
+
+def v_inv(variable, n=3):
+    size = n * n
+    variable -= 1
+    return variable // (size * size) + 1, variable // size % size + 1, variable % size + 1
+
+
+def _rows(n):
+    size = n * n
+    rows = np.repeat(np.arange(size), size).reshape(size, size)
+    return rows, rows.T.copy()
+
+
+def _columns(n):
+    rows, columns = _rows(n)
+    return columns, rows
+
+
+def _blocks(n):
+    # the cells of each box, numbered like valid_blocks(): rows change faster than columns
+    size = n * n
+    starts = np.arange(0, size, n)
+    k = np.arange(size)
+    rows = (starts[:, None, None] + (k % n)[None, None, :]).repeat(n, axis=1)
+    columns = (starts[None, :, None] + (k // n)[None, None, :]).repeat(n, axis=0)
+    return rows.reshape(size, size), columns.reshape(size, size)
+
+
+def _at_least_one(n, cells):
+    # for each group of cells and each digit, the digit appears in one of the cells
+    rows, columns = cells
+    cube = variables(n)[rows, columns, :]
+    return ClauseBlock.from_matrix(cube.transpose(0, 2, 1).reshape(-1, n * n))
+
+
+def _pairwise(n, cells):
+    # for each group of cells, each pair of cells and each digit, not both cells hold the digit
+    rows, columns = cells
+    cube = variables(n)[rows, columns, :]
+    first, second = np.triu_indices(n * n, 1)
+    pairs = np.stack((-cube[:, first, :], -cube[:, second, :]), axis=-1)
+    return ClauseBlock.from_matrix(pairs.reshape(-1, 2))
+
+
+def valid_cells(n):
+    return ClauseBlock.from_matrix(variables(n).reshape(-1, n * n))
+
+
+def unique_cells(n):
+    cube = variables(n)
+    first, second = np.triu_indices(n * n, 1)
+    pairs = np.stack((-cube[:, :, first], -cube[:, :, second]), axis=-1)
+    return ClauseBlock.from_matrix(pairs.reshape(-1, 2))
+
+
+def valid_rows(n):
+    return _at_least_one(n, _rows(n))
+
+
+def valid_columns(n):
+    return _at_least_one(n, _columns(n))
+
+
+def valid_blocks(n):
+    return _at_least_one(n, _blocks(n))
+
+
+def unique_rows(n):
+    return _pairwise(n, _rows(n))
+
+
+def unique_columns(n):
+    return _pairwise(n, _columns(n))
+
+
+def unique_blocks(n):
+    return _pairwise(n, _blocks(n))
+
+
+def _pairs(n):
+    size = n * n
+    return size * (size - 1) // 2
+
+
+def minimal_clauses(n=3):
+    res = ClauseBlock.concatenate([valid_cells(n), unique_rows(n), unique_columns(n), unique_blocks(n)])
+    size = n * n
+    assert len(res) == size * size + 3 * size * size * _pairs(n)
+    return res
+
+
+def efficient_clauses(n=3):
+    res = ClauseBlock.concatenate([valid_cells(n), unique_cells(n),
+                                   unique_rows(n), unique_columns(n), unique_blocks(n)])
+    size = n * n
+    assert len(res) == size * size * (1 + _pairs(n)) + 3 * size * size * _pairs(n)
+    return res
+
+
+def extended_clauses(n=3):
+    res = ClauseBlock.concatenate([valid_cells(n), unique_cells(n),
+                                   valid_rows(n), unique_rows(n),
+                                   valid_columns(n), unique_columns(n),
+                                   valid_blocks(n), unique_blocks(n)])
+    size = n * n
+    assert len(res) == size * size * (1 + _pairs(n)) + 3 * size * size * _pairs(n) + 3 * size * size
+    return res
@@ -3,27 +3,75 @@
 sudoku_sat_solver.py
 """
 
+import os
 import sys
 import re
 import time
+import shutil
+import tempfile
+import multiprocessing
+import multiprocessing.util
 import getopt
 import fileinput
 import itertools
+import random
+import cProfile
+import pstats
 from pprint import pprint
-from math import sqrt
-from subprocess import call
+from math import sqrt, ceil
+from functools import partial
+from subprocess import Popen, PIPE
+
+import numpy as np
+
+import cdcl
+from clause_arrays import SolutionMatrix, ClauseSet
+from sudoku_symmetry import OrbitCache, symmetry_moving
+from puzzle_source import PuzzleSource
+from metrics import METRICS
+from clause_sketch import CountMinSketch
+from checkpoint import checkpoint_name, save_checkpoint, load_checkpoint
+from validity_cache import ValidityCache, encoding_fingerprint
+from clause_library import load_clauses
+from sudoku_encodings import ClauseBlock
 
 COMMAND = 'minisat %s %s > %s'
 LOGFILE = "minisat.log"
 DIMACS_OUT = "dimacs_clauses.txt"
 MINISAT_OUT = "minisat_out.txt"
 VALID_OUT = "valid_clauses.txt"
+STATISTICS = ("restarts", "conflicts", "decisions", "propagations")
 
 help_message = '''[options]
 Options:
     -h --help           This help
     -p --problem file   Problem to be converted to sat.
     -t --train file     Train and Train a sat.
+    -s --solver name    Solver backend: minisat, pysat or cdcl (default: pysat if installed).
+    -j --jobs n         Solve puzzles and check validities on n worker processes.
+    -e --encoding name  minimal, efficient, extended (default) or one of the compact
+                        at-most-one encodings sequential, commander and product.
+    --simplify          Propagate the givens and only send the residual formula to the solver.
+    --orbits            Decide validity once per orbit of the Sudoku symmetry group (minimal,
+                        efficient and extended encodings only).
+    --cache file        Keep validity verdicts in an SQLite file and reuse them in later runs.
+    --all-kernels       Keep every minimal valid subclause of a validity instead of one.
+    --index file        Keep the line offsets of the puzzle file in a .npy file between runs.
+    --metrics file      Append stage timings and counters as one JSON line per batch.
+    --profile file      Profile the run with cProfile, save the stats and print the top entries.
+    --resume            Continue training from the checkpoint written after the last finished batch.
+    --min-count x       Only check the validity of clauses learnt on at least x puzzles so far.
+    --prune-sample k    Check k of the clauses dropped by --min-count per batch to estimate the
+                        validities missed (default: 50).
+    --pipeline          Prune and check the clauses learnt on a batch while its remaining puzzles are
+                        still being solved, on -j solver processes (at least one).
+    --binaries file     Derive all valid unit and binary clauses over the v(i, j, d) of the encoding
+                        by failed-literal probing, write them to file and add them to the base.
+    --portfolio configs With -p, race comma separated configurations, encoding or encoding+validity
+                        file, on every puzzle and take the first answer (ignores -e, -v and -j).
+    --serve             Answer puzzles read from stdin, one per line, on the warm encoding and
+                        validities, with the solution and solver statistics.
+    --socket path       As --serve, but read the puzzles from connections to a Unix socket.
 '''
 
 
@@ -233,22 +281,146 @@ def redundant_sudoku_clauses():  # Add the following redundant constraints:
     pass
 
 
+# Compact at-most-one encodings. valid() states that no two of the variables are true with one clause
+# per pair, which is quadratic in the size of the group. The encodings below introduce auxiliary
+# variables, numbered from LAST_VARIABLE + 1 on by the shared counter aux, and need a linear number
+# of clauses.
+LAST_VARIABLE = 729
+
+
+def amo_pairwise(literals, aux):
+    return [[-a, -b] for a, b in itertools.combinations(literals, 2)]
+
+
+def amo_sequential(literals, aux):
+    # Sinz' sequential counter: s_k is true as soon as one of the first k literals is true
+    if len(literals) <= 1:
+        return []
+    res = []
+    counters = [next(aux) for _ in literals[:-1]]
+    res.append([-literals[0], counters[0]])
+    for k in range(1, len(literals) - 1):
+        res.append([-literals[k], counters[k]])
+        res.append([-counters[k - 1], counters[k]])
+        res.append([-literals[k], -counters[k - 1]])
+    res.append([-literals[-1], -counters[-1]])
+    return res
+
+
+def amo_commander(literals, aux, group_size=3):
+    # Klieber and Kwon: at most one literal per group, and a true literal forces its group's
+    # commander, of which again at most one may be true
+    if len(literals) <= group_size + 1:
+        return amo_pairwise(literals, aux)
+    res = []
+    commanders = []
+    for start in range(0, len(literals), group_size):
+        group = literals[start:start + group_size]
+        commander = next(aux)
+        commanders.append(commander)
+        res += amo_pairwise(group, aux)
+        res += [[-literal, commander] for literal in group]
+    res += amo_commander(commanders, aux, group_size)
+    return res
+
+
+def amo_product(literals, aux):
+    # Chen's product encoding: the literals are laid out on a grid, a true literal forces its row and
+    # its column variable, and at most one row and one column variable may be true
+    if len(literals) <= 4:
+        return amo_pairwise(literals, aux)
+    rows = int(ceil(sqrt(len(literals))))
+    columns = int(ceil(len(literals) / float(rows)))
+    row_variables = [next(aux) for _ in range(rows)]
+    column_variables = [next(aux) for _ in range(columns)]
+    res = []
+    for k, literal in enumerate(literals):
+        res.append([-literal, row_variables[k // columns]])
+        res.append([-literal, column_variables[k % columns]])
+    res += amo_product(row_variables, aux)
+    res += amo_product(column_variables, aux)
+    return res
+
+
+def amo_cells(amo, aux):
+    res = []
+    for i in range(1, 10):
+        for j in range(1, 10):
+            res += amo([v(i, j, d) for d in range(1, 10)], aux)
+    return res
+
+
+def amo_groups(amo, aux, groups):
+    res = []
+    for cells in groups:
+        for d in range(1, 10):
+            res += amo([v(i, j, d) for i, j in cells], aux)
+    return res
+
+
+def amo_rows(amo, aux):
+    return amo_groups(amo, aux, [[(i, j) for j in range(1, 10)] for i in range(1, 10)])
+
+
+def amo_columns(amo, aux):
+    return amo_groups(amo, aux, [[(j, i) for j in range(1, 10)] for i in range(1, 10)])
+
+
+def amo_blocks(amo, aux):
+    return amo_groups(amo, aux, [[(i + k % 3, j + k // 3) for k in range(9)] for i in (1, 4, 7) for j in (1, 4, 7)])
+
+
+def compact_sudoku_clauses(amo):  # the "efficient" encoding with a compact at-most-one encoding
+    aux = itertools.count(LAST_VARIABLE + 1)
+    res = []
+    res += valid_cells()
+    res += amo_cells(amo, aux)
+    res += amo_rows(amo, aux)
+    res += amo_columns(amo, aux)
+    res += amo_blocks(amo, aux)
+    return res
+
+
+def compact_sudoku_clauses_with_cats(amo):
+    # same order as compact_sudoku_clauses, so the auxiliary variables are numbered the same way
+    aux = itertools.count(LAST_VARIABLE + 1)
+    validcells = clause_sets(valid_cells())
+    uniquecells = clause_sets(amo_cells(amo, aux))
+    uniquerows = clause_sets(amo_rows(amo, aux))
+    uniquecolumns = clause_sets(amo_columns(amo, aux))
+    uniqueblocks = clause_sets(amo_blocks(amo, aux))
+    res = dict({"vcell": validcells, "ucell": uniquecells, "urow": uniquerows,
+                "ucol": uniquecolumns, "ublock": uniqueblocks})
+
+    return res
+
+
+# the encodings the Sudoku symmetries map onto themselves, see sudoku_symmetry
+SYMMETRIC_ENCODINGS = ("minimal", "efficient", "extended")
+
+# name: (base clauses, base clauses with categories)
+ENCODINGS = {
+    "minimal": (minimal_sudoku_clauses, minimal_sudoku_clauses_with_cats),
+    "efficient": (sudoku_clauses, efficient_sudoku_clauses_with_cats),
+    "extended": (extended_sudoku_clauses, extended_sudoku_clauses_with_cats),
+    "sequential": (partial(compact_sudoku_clauses, amo_sequential),
+                   partial(compact_sudoku_clauses_with_cats, amo_sequential)),
+    "commander": (partial(compact_sudoku_clauses, amo_commander),
+                  partial(compact_sudoku_clauses_with_cats, amo_commander)),
+    "product": (partial(compact_sudoku_clauses, amo_product),
+                partial(compact_sudoku_clauses_with_cats, amo_product)),
+}
+
+
 def read_sudoku(sudoku_as_line):
-    instance_clauses = []
-
-    i = 1
-    j = 1
-    for character in sudoku_as_line:
-        if character == "\n":
-            break
-        d = int(character)
-        if d:
-            instance_clauses.append([v(i, j, d)])
-        j = j + 1
-        if j > 9:
-            i = i + 1
-            j = 1
-    return instance_clauses
+    """
+    :return: a unit clause for every given; v(i, j, d) is 9 * cell + d with cells numbered row by row
+    """
+    digits = sudoku_as_line.split("\n", 1)[0].rstrip("\r").encode()
+    if digits.translate(None, b"0123456789"):
+        raise ValueError("a sudoku line holds the digits 0 to 9 only: {!r}".format(sudoku_as_line[:100]))
+    # iterating over bytes yields the character codes, and ord("0") == 48
+    return [[9 * cell + digit - 48] for cell, digit in enumerate(digits) if digit != 48]
 
 
 class Usage(Exception):
@@ -256,11 +428,58 @@ class Usage(Exception):
         self.msg = msg
 
 
-def dimacs_out(filename, clauses):
-    with open(filename, "w") as fileobj:
-        for clause in clauses:
-            line = " ".join([str(literal) for literal in clause]) + " 0\n"
-            fileobj.write(line)
+def dimacs_header(number_of_variables, number_of_clauses):
+    # fixed width, so append_dimacs can update the counts in place
+    return "p cnf {:<10d} {:<10d}\n".format(number_of_variables, number_of_clauses).encode()
+
+
+def dimacs_body(clauses):
+    """
+    :param clauses: iterable of clauses
+    :return: the clauses as DIMACS bytes without a header, and the largest variable in them
+    """
+    if hasattr(clauses, "dimacs"):
+        # a ClauseBlock from sudoku_encodings formats all its literals at once
+        return clauses.dimacs(), clauses.number_of_variables
+    number_of_variables = 0
+    lines = []
+    for clause in clauses:
+        clause = [int(literal) for literal in clause]
+        if clause:
+            number_of_variables = max(number_of_variables, max(clause), -min(clause))
+        lines.append(" ".join(map(str, clause)) + " 0\n")
+    return "".join(lines).encode(), number_of_variables
+
+
+def int_clauses(clauses):
+    """
+    :return: the clauses as lists of Python ints; a ClauseBlock converts all its literals at once
+    """
+    if hasattr(clauses, "dimacs"):
+        return list(clauses)
+    return [[int(x) for x in clause] for clause in clauses]
+
+
+def dimacs_out(filename, clauses, body=None):
+    if body is None:
+        clauses = list(clauses)
+        body, number_of_variables = dimacs_body(clauses)
+    else:
+        body, number_of_variables = body
+    with open(filename, "wb") as fileobj:
+        fileobj.write(dimacs_header(number_of_variables, len(clauses)))
+        fileobj.write(body)
+    METRICS.count("dimacs.bytes", len(body))
+
+
+def read_dimacs(filename):
+    clauses = []
+    with open(filename, "r") as fileobj:
+        for line in fileobj:
+            if line.startswith(("c", "p")) or not line.strip():
+                continue
+            clauses.append([int(x) for x in line.split()[:-1]])
+    return clauses
 
 
 def read_results(ret, output_file, logfile):
@@ -291,76 +510,636 @@ def read_results(ret, output_file, logfile):
 def negate(clause):
     return [[-x] for x in clause]
 
-def is_clause_valid(clause, base_clauses):
-    negated_clauses = negate(clause)
-    add_to_base_dimacs(negated_clauses)
-    ret = call(COMMAND % (DIMACS_OUT, MINISAT_OUT, LOGFILE), shell=True)
-    satisfied, _ , _ = read_results(ret, MINISAT_OUT, LOGFILE)
-    # if we found a clause which is not satisfiable - Success!
-    remove_x_lines_from_base_dimacs(number_of_lines=len(negated_clauses))
-    if not satisfied:
+class Session(object):
+    """
+    Common part of the solver sessions.
+
+    A session answers queries against a base encoding: solve(units) solves the base clauses plus the
+    given unit clauses and returns the (sat, solution, learnt) triple of read_results, is_valid(clause)
+    decides whether the clause follows from the base clauses, and add_clauses(clauses) extends the base
+    clauses for all later queries. Backends implement _solve(units) and _solve_formula(clauses), which
+    solves a formula on its own, without the base clauses.
+
+    With simplify set, solve() first propagates the units over the base clauses and only hands the
+    residual formula to the solver, see Simplifier.
+    """
+    backend = None
+    reports_learnt = False
+    simplify = False
+    _simplifier = None
+
+    def solve(self, units=()):
+        """
+        :param units: literals that are added as unit clauses for this call only
+        :return: the (sat, solution, learnt) triple of read_results
+        """
+        if self.simplify:
+            return solve_simplified(self, units)
+        return self._solve(units)
+
+    def solve_fresh(self, units=()):
+        """
+        As solve(), but on a new solver for this call only, so that nothing the session learnt in
+        earlier calls carries over; for measurements that must not depend on the calls before.
+        """
+        if self.simplify:
+            # the residual formula is solved on a new solver anyway
+            return solve_simplified(self, units)
+        return self._solve_formula(self.clauses + [[literal] for literal in units])
+
+    def is_valid(self, clause):
+        satisfied, _, _ = self._solve([-x for x in clause])
+        return not satisfied
+
+    def valid_core(self, clause):
+        """
+        :return: None if the clause does not follow from the base clauses, otherwise a subset of it that
+                 still does; backends without unsat cores return the whole clause
+        """
+        if self.is_valid(clause):
+            return frozenset(clause)
+        return None
+
+    def close(self):
+        pass
+
+
+class SubprocessSession(Session):
+    """
+    Solver session that runs every query through a fresh ``minisat`` process.
+
+    The base clauses are serialized to DIMACS bytes once. Each query pipes a header, those bytes and
+    the per-call unit clauses into minisat's stdin, and the result and log files are read back, so
+    the DIMACS file on disk is only written when the session is created or clauses are added. It is
+    kept as a fallback for machines without an in-process solver.
+    """
+    backend = "minisat"
+    reports_learnt = True
+
+    def __init__(self, base_clauses=None, dimacs_file=DIMACS_OUT, output_file=MINISAT_OUT, logfile=LOGFILE):
+        self.dimacs_file = dimacs_file
+        self.output_file = output_file
+        self.logfile = logfile
+        self.stats = {}
+        if base_clauses is None:
+            # continue from whatever the DIMACS file currently holds
+            self.clauses = read_dimacs(dimacs_file)
+            self._body, self._number_of_variables = dimacs_body(self.clauses)
+        else:
+            self._body, self._number_of_variables = dimacs_body(base_clauses)
+            self.clauses = int_clauses(base_clauses)
+            dimacs_out(dimacs_file, self.clauses, body=(self._body, self._number_of_variables))
+
+    def add_clauses(self, clauses):
+        body, number_of_variables = dimacs_body(clauses)
+        clauses = int_clauses(clauses)
+        self.clauses.extend(clauses)
+        self._body += body
+        self._number_of_variables = max(self._number_of_variables, number_of_variables)
+        append_dimacs(self.dimacs_file, clauses, (body, number_of_variables))
+
+    def _solve(self, units):
+        return self._run(self.dimacs(units))
+
+    def solve_fresh(self, units=()):
+        # every run is a new minisat process anyway
+        return self.solve(units)
+
+    def dimacs(self, units):
+        """
+        :return: the DIMACS bytes of the base clauses plus the units, as piped to minisat
+        """
+        delta, number_of_variables = dimacs_body([literal] for literal in units)
+        header = dimacs_header(max(self._number_of_variables, number_of_variables),
+                               len(self.clauses) + len(units))
+        return header + self._body + delta
+
+    def _solve_formula(self, clauses):
+        body, number_of_variables = dimacs_body(clauses)
+        return self._run(dimacs_header(number_of_variables, len(clauses)) + body)
+
+    def _run(self, dimacs):
+        process = Popen(COMMAND % ("/dev/stdin", self.output_file, self.logfile), shell=True, stdin=PIPE)
+        process.communicate(dimacs)
+        METRICS.count("dimacs.bytes", len(dimacs))
+        ret = process.returncode
+        result = read_results(ret, self.output_file, self.logfile)
+        self.stats = read_statistics(self.logfile)
+        return result
+
+
+class PysatSession(Session):
+    """
+    Solver session that keeps the base encoding loaded in an in-process MiniSat (python-sat).
+
+    The base clauses are parsed once; a query only passes its literals as assumptions, so nothing is
+    written to disk and the solver keeps the clauses it learnt from earlier queries. MiniSat does not
+    hand its learnt clauses to python-sat, so solve() always reports an empty set of learnt clauses.
+    """
+    backend = "pysat"
+    reports_learnt = False
+
+    def __init__(self, base_clauses):
+        self.clauses = int_clauses(base_clauses)
+        self.stats = {}
+        self._solver = self._minisat(self.clauses)
+
+    @staticmethod
+    def _minisat(clauses):
+        from pysat.solvers import Minisat22
+        return Minisat22(bootstrap_with=clauses)
+
+    def add_clauses(self, clauses):
+        clauses = int_clauses(clauses)
+        self.clauses.extend(clauses)
+        for clause in clauses:
+            self._solver.add_clause(clause)
+
+    def _solve(self, units, solver=None):
+        solver = solver or self._solver
+        before = solver.accum_stats()
+        sat = solver.solve(assumptions=list(units))
+        after = solver.accum_stats()
+        self.stats = dict((key, after.get(key, 0) - before.get(key, 0)) for key in STATISTICS)
+        solution = frozenset(solver.get_model()) if sat else frozenset()
+        return sat, solution, set()
+
+    def _solve_formula(self, clauses):
+        solver = self._minisat(clauses)
+        try:
+            return self._solve((), solver)
+        finally:
+            solver.delete()
+
+    def valid_core(self, clause):
+        satisfied, _, _ = self._solve([-x for x in clause])
+        if satisfied:
+            return None
+        # the core is the subset of the assumptions, the negated literals, that the refutation used
+        return frozenset(-x for x in self._solver.get_core() or ())
+
+    def close(self):
+        self._solver.delete()
+
+
+class CDCLSession(Session):
+    """
+    Solver session on the pure Python CDCL solver in cdcl.py, so no external binary is needed.
+
+    Validity queries run incrementally under assumptions on one solver that keeps the base encoding
+    loaded. Puzzles are solved on a fresh copy with the givens as top level unit clauses, as minisat
+    does, since learnt clauses derived under assumptions would all be consequences of the base
+    encoding alone. Every learnt clause is collected through the solver's callback.
+    """
+    backend = "cdcl"
+    reports_learnt = True
+
+    def __init__(self, base_clauses):
+        self.clauses = int_clauses(base_clauses)
+        self.stats = {}
+        self._solver = cdcl.Solver(self.clauses)
+
+    def add_clauses(self, clauses):
+        clauses = int_clauses(clauses)
+        self.clauses.extend(clauses)
+        for clause in clauses:
+            self._solver.add_clause(clause)
+
+    def _solve(self, units):
+        return self._solve_formula(self.clauses + [[literal] for literal in units])
+
+    def _solve_formula(self, clauses):
+        solver = cdcl.Solver(clauses)
+        learnt = set()
+        sat = solver.solve(on_learnt=lambda clause: learnt.add(frozenset(clause)))
+        self.stats = dict(solver.stats)
+        solution = frozenset(solver.model) if sat else frozenset()
+        return sat, solution, learnt
+
+    def is_valid(self, clause):
+        before = dict(self._solver.stats)
+        satisfied = self._solver.solve([-x for x in clause])
+        self.stats = dict((key, self._solver.stats[key] - before[key]) for key in STATISTICS)
+        return not satisfied
+
+    def valid_core(self, clause):
+        if not self.is_valid(clause):
+            return None
+        return frozenset(-x for x in self._solver.core)
+
+
+class Simplifier(object):
+    """
+    Propagates the givens of a puzzle over the base clauses before it is solved.
+
+    simplify() runs unit propagation, drops the satisfied clauses, strips the false literals and
+    renumbers the remaining variables from 1, so the solver only sees the residual formula. With
+    17 to 30 givens most of the base clauses are gone after propagation.
+    """
+
+    def __init__(self, clauses):
+        self.clauses = clauses
+        self.size = len(clauses)
+        self.number_of_variables = 0
+        self.occurrences = {}
+        for index, clause in enumerate(clauses):
+            for literal in clause:
+                self.occurrences.setdefault(literal, []).append(index)
+                self.number_of_variables = max(self.number_of_variables, abs(literal))
+
+    def simplify(self, units):
+        """
+        :param units: the literals to propagate
+        :return: the residual clauses, the list mapping their variables to the original ones (index 0
+                 unused) and the literals fixed by propagation, or None if propagation runs into a conflict
+        """
+        clauses = self.clauses
+        occurrences = self.occurrences
+        value = {}
+        satisfied = bytearray(self.size)
+        false_literals = {}
+        queue = list(units)
+        for literal in queue:
+            variable = abs(literal)
+            if variable in value:
+                if value[variable] != literal:
+                    return None
+                continue
+            value[variable] = literal
+            for index in occurrences.get(literal, ()):
+                satisfied[index] = 1
+            for index in occurrences.get(-literal, ()):
+                if satisfied[index]:
+                    continue
+                count = false_literals.get(index, 0) + 1
+                false_literals[index] = count
+                clause = clauses[index]
+                if count == len(clause):
+                    return None
+                if count == len(clause) - 1:
+                    for other in clause:
+                        if abs(other) not in value:
+                            queue.append(other)
+                            break
+
+        variables = [0]
+        renumbered = {}
+        residual = []
+        for index, clause in enumerate(clauses):
+            if satisfied[index]:
+                continue
+            new_clause = []
+            for literal in clause:
+                variable = abs(literal)
+                if variable in value:
+                    continue
+                if variable not in renumbered:
+                    renumbered[variable] = len(variables)
+                    variables.append(variable)
+                new_clause.append(renumbered[variable] if literal > 0 else -renumbered[variable])
+            residual.append(new_clause)
+        return residual, variables, list(value.values())
+
+
+def solve_simplified(session, units):
+    """
+    Solves the base clauses of the session plus the units through the residual formula of a Simplifier.
+
+    :return: the (sat, solution, learnt) triple over the original variables
+    """
+    if session._simplifier is None or session._simplifier.size != len(session.clauses):
+        session._simplifier = Simplifier(session.clauses)
+    simplifier = session._simplifier
+    simplified = simplifier.simplify(units)
+    if simplified is None:
+        session.stats = dict.fromkeys(STATISTICS, 0)
+        return False, frozenset(), set()
+    residual, variables, fixed = simplified
+
+    def original(literal):
+        return variables[literal] if literal > 0 else -variables[-literal]
+
+    sat, model, learnt = session._solve_formula(residual)
+    learnt = set(frozenset(original(literal) for literal in clause) for clause in learnt)
+    if not sat:
+        return False, frozenset(), learnt
+    assignment = dict((abs(literal), literal) for literal in fixed)
+    for literal in model:
+        assignment[variables[abs(literal)]] = original(literal)
+    # variables that only occurred in satisfied clauses can take any value
+    solution = frozenset(assignment.get(variable, -variable)
+                         for variable in range(1, simplifier.number_of_variables + 1))
+    return True, solution, learnt
+
+
+SESSIONS = {"minisat": SubprocessSession, "pysat": PysatSession, "cdcl": CDCLSession}
+
+
+def default_backend():
+    try:
+        import pysat.solvers
+    except ImportError:
+        return "minisat"
+    return "pysat"
+
+
+def open_session(base_clauses, backend=None, workdir=None, simplify=False):
+    """
+    :param base_clauses: the encoding the session answers queries against
+    :param backend: one of SESSIONS, by default the in-process solver if it is installed
+    :param workdir: directory for the scratch files of the minisat backend, by default the current one
+    :param simplify: propagate the units of solve() before solving, see Simplifier
+    :return: a Session
+    """
+    if backend is None:
+        backend = default_backend()
+    if backend not in SESSIONS:
+        raise Usage("unknown solver backend: {}".format(backend))
+    if backend == "minisat" and workdir is not None:
+        session = SubprocessSession(base_clauses,
+                                    dimacs_file=os.path.join(workdir, DIMACS_OUT),
+                                    output_file=os.path.join(workdir, MINISAT_OUT),
+                                    logfile=os.path.join(workdir, LOGFILE))
+    else:
+        session = SESSIONS[backend](base_clauses)
+    session.simplify = simplify
+    return session
+
+
+_worker_session = None
+
+
+def _init_worker(backend, clauses, simplify):
+    # every worker gets its own session and, for minisat, its own scratch directory
+    global _worker_session
+    workdir = tempfile.mkdtemp(prefix="sudoku_worker_")
+    multiprocessing.util.Finalize(None, shutil.rmtree, args=(workdir, True), exitpriority=0)
+    _worker_session = open_session(clauses, backend, workdir=workdir, simplify=simplify)
+
+
+def _run_in_worker(function, item):
+    return function(item, _worker_session)
+
+
+class SessionPool(object):
+    """
+    Wraps a session and runs map() over a pool of worker processes, each holding a copy of the session.
+
+    Queries that are not mapped go to the wrapped session. The workers are started on the first map()
+    and restarted when clauses were added to the wrapped session since, so they always answer against
+    the same formula. map() returns the results in the order of the items, so merging them does not
+    depend on how the work was spread over the workers.
+    """
+
+    def __init__(self, session, jobs):
+        self.session = session
+        self.jobs = jobs
+        self._pool = None
+        self._pool_clauses = 0
+
+    @property
+    def backend(self):
+        return self.session.backend
+
+    @property
+    def reports_learnt(self):
+        return self.session.reports_learnt
+
+    @property
+    def clauses(self):
+        return self.session.clauses
+
+    @property
+    def stats(self):
+        return self.session.stats
+
+    def add_clauses(self, clauses):
+        self.session.add_clauses(clauses)
+
+    def solve(self, units=()):
+        return self.session.solve(units)
+
+    def solve_fresh(self, units=()):
+        return self.session.solve_fresh(units)
+
+    def is_valid(self, clause):
+        return self.session.is_valid(clause)
+
+    def valid_core(self, clause):
+        return self.session.valid_core(clause)
+
+    def map(self, function, items):
+        """
+        :param function: a module level function taking an item and a session
+        :param items: the work items
+        :return: the list of results, in the order of items
+        """
+        items = list(items)
+        if len(items) <= 1 or not self.start():
+            return [function(item, self.session) for item in items]
+        chunksize = max(1, len(items) // (4 * self.jobs))
+        return self._pool.map(partial(_run_in_worker, function), items, chunksize)
+
+    def start(self):
+        """
+        Starts the workers, or restarts them if clauses were added since. Forked workers inherit the open
+        file descriptors, so this must not happen while solver subprocesses are waiting for their input.
+
+        :return: False if the queries run in this process instead
+        """
+        # the workers are not forks of the session, each opens one of its own on the clauses, see _init_worker
+        if self.jobs <= 1:
+            return False
+        if self._pool is not None and self._pool_clauses != len(self.clauses):
+            self.close()
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.jobs, _init_worker,
+                                              (self.backend, self.clauses, self.session.simplify))
+            self._pool_clauses = len(self.clauses)
         return True
-    return False
 
-def check_validity(learnt, base_clauses):
+    def close(self):
+        # stops the workers, the wrapped session stays open
+        if self._pool is not None:
+            # let the workers exit normally so they remove their scratch directories
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def map_queries(function, items, session):
+    # checked by attribute rather than class, since run as a script this module is loaded twice, as
+    # __main__ and as sudoku_sat_solver for training_pipeline
+    if hasattr(session, "map"):
+        return session.map(function, items)
+    return [function(item, session) for item in items]
+
+
+def read_statistics(logfile):
+    stats = {}
+    pattern = re.compile(r"^({})\s*:\s*(\d+)".format("|".join(STATISTICS)))
+    with open(logfile, "r") as fileobj:
+        for line in fileobj:
+            match = pattern.match(line)
+            if match:
+                stats[match.group(1)] = int(match.group(2))
+    return stats
+
+
+def is_clause_valid(clause, base_clauses, session=None):
+    if session is None:
+        # without a session we query whatever DIMACS_OUT currently holds
+        session = SubprocessSession()
+    # if the negation of the clause is not satisfiable - Success!
+    return session.is_valid(clause)
+
+def query_validity(clause, session):
+    return session.is_valid(clause)
+
+def check_validity(learnt, base_clauses, session=None, orbits=None, cache=None):
+    """
+    :param orbits: an OrbitCache from sudoku_symmetry; if given, validity is decided once per orbit
+    :param cache: a ValidityCache from validity_cache; clauses it knows are not sent to the solver
+    :return: set of (clause, 0) for the valid clauses
+    """
     start_time = time.time()
     valid_clauses = set()
+    if session is None:
+        session = SubprocessSession()
+    learnt = list(learnt)
+    verdicts = {}
+    if cache is not None:
+        for clause in learnt:
+            verdict = cache.get(clause)
+            if verdict is not None:
+                verdicts[clause] = verdict
+    pending = [clause for clause in learnt if clause not in verdicts]
+    # for each learnt clause we are interested in if it is a globally valid clause.
+    # when we negate a clause, we get many conjuncted clauses
+    # the checks are independent, so a SessionPool spreads them over its workers
+    if orbits is None:
+        new_verdicts = map_queries(query_validity, pending, session)
+        METRICS.count("calls.validity", len(pending))
+    else:
+        # only one member of each orbit that has no verdict yet goes to the solver
+        unknown = orbits.representatives(clause for clause in pending if orbits.get(clause) is None)
+        for clause, valid in zip(unknown, map_queries(query_validity, unknown, session)):
+            orbits.add(clause, valid)
+        new_verdicts = [orbits.get(clause) for clause in pending]
+        print("orbits: clauses={}, solver calls={}".format(len(pending), len(unknown)))
+        METRICS.count("calls.validity", len(unknown))
+    for clause, valid in zip(pending, new_verdicts):
+        verdicts[clause] = valid
+        if cache is not None:
+            cache.add(clause, valid)
+    if cache is not None:
+        cache.flush()
+        print("validity cache: hits={}, new={}".format(len(learnt) - len(pending), len(pending)))
+        METRICS.count("cache.hits", len(learnt) - len(pending))
+        METRICS.count("cache.misses", len(pending))
     for learn in learnt:
-        # for each learnt clause we are interested in if it is a globally valid clause.
-        # when we negate a clause, we get many conjuncted clauses
-        if is_clause_valid(learn, base_clauses):
+        if verdicts[learn]:
             valid_clauses.add((learn, 0))
+    METRICS.count("check_validity.in", len(learnt))
+    METRICS.count("check_validity.out", len(valid_clauses))
 
     end_time = time.time()
     print("validity checking (including pruning): {}".format(end_time - start_time))
     return valid_clauses
 
 
+class SubsumptionIndex(object):
+    """
+    Finds the base clauses that are subsets of a given clause without testing all of them.
+
+    Every base clause is filed under its rarest literal, so a base clause that is a subset of a clause
+    is always filed under one of the clause's literals and only those lists have to be tested. The
+    matches are returned in the order in which looping over base_clauses_with_cats would find them.
+    """
+
+    def __init__(self, base_clauses_with_cats):
+        self.base_clauses_with_cats = base_clauses_with_cats
+        counts = {}
+        for key in base_clauses_with_cats:
+            for baseclause in base_clauses_with_cats[key]:
+                for literal in baseclause:
+                    counts[literal] = counts.get(literal, 0) + 1
+        self.index = {}
+        position = 0
+        for key in base_clauses_with_cats:
+            for baseclause in base_clauses_with_cats[key]:
+                rarest = min(baseclause, key=lambda literal: (counts[literal], literal))
+                self.index.setdefault(rarest, []).append((position, key, baseclause))
+                position += 1
+
+    def subsets(self, clause):
+        """
+        :return: list of (category, base clause) for all base clauses that are subsets of the clause
+        """
+        found = []
+        for literal in clause:
+            for entry in self.index.get(literal, ()):
+                if entry[2].issubset(clause):
+                    found.append(entry)
+        found.sort(key=lambda entry: entry[0])
+        return [(key, baseclause) for _, key, baseclause in found]
+
+    def first_subset(self, clause):
+        """
+        :return: (category, base clause) of the first base clause that is a subset of the clause, or None
+        """
+        found = None
+        for literal in clause:
+            for entry in self.index.get(literal, ()):
+                if (found is None or entry[0] < found[0]) and entry[2].issubset(clause):
+                    found = entry
+        return None if found is None else (found[1], found[2])
+
+
+def subsumption_index(base_clauses_with_cats):
+    if hasattr(base_clauses_with_cats, "first_subset"):
+        return base_clauses_with_cats
+    return SubsumptionIndex(base_clauses_with_cats)
+
+
 def logically_prune(learned_clauses, solutions, base_clauses_with_cats):
     """
 
-    :param learned_clauses: a set of sets of learned clauses from n runs on n different Sudokus
+    :param learned_clauses: a set of sets of learned clauses from n runs on n different Sudokus, or a ClauseSet
+    :param solutions: the known solutions, a set of frozensets or a SolutionMatrix
+    :param base_clauses_with_cats: a dictionary of categories of base clauses or its SubsumptionIndex
     :return: the logically pruned set of learned clauses
     """
     start_time = time.time()
     # Delete duplicate clauses.
     valid_clauses = set()
     print("start={}".format(len(learned_clauses)))
+    METRICS.count("logically_prune.in", len(learned_clauses))
     # delete unit clauses
-    learned_clauses = [clause for clause in learned_clauses if len(clause) >= 2]
+    learned_clauses = ClauseSet(clause for clause in learned_clauses if len(clause) >= 2)
     # check if clause is satisfied for all known sudoku solutions
-    need_processing = set()
-    for clause in learned_clauses:
-        for solution in solutions:
-            satisfied = False
-            for variable in clause:
-                if variable in solution:
-                    satisfied = True
-                    break
-            if not satisfied:
-                break
-        if satisfied:
-            need_processing.add(clause)
+    if not isinstance(solutions, SolutionMatrix):
+        solutions = SolutionMatrix(solutions)
+    satisfied = solutions.satisfied_by_all(learned_clauses)
+    need_processing = ClauseSet(clause for clause, ok in zip(learned_clauses, satisfied) if ok)
+    METRICS.count("logically_prune.satisfied", len(need_processing))
     # remove already known valid clauses
-    needz_processing = set()
+    index = subsumption_index(base_clauses_with_cats)
+    needz_processing = ClauseSet()
     for clause in need_processing:
-        next_clause = False
-        for key in base_clauses_with_cats:
-            for baseclause in base_clauses_with_cats[key]:
-                if baseclause.issubset(clause):
-                    valid_clauses.add((clause,baseclause))
-                    next_clause = True
-                    break
-            if next_clause:
-                break
-        if not next_clause:
+        found = index.first_subset(clause)
+        if found:
+            valid_clauses.add((clause, found[1]))
+        else:
             needz_processing.add(clause)
 
-    need_processing = set()
+    need_processing = ClauseSet()
     for clause in needz_processing:
         if not (len([int(literal) <= 0 for literal in clause]) == 1 or len([int(literal) <= 0 for literal in clause]) == 0 and len(clause) <= 9):
             need_processing.add(clause)
     print("end={}".format(len(need_processing)))
+    METRICS.count("logically_prune.subsumed", len(valid_clauses))
+    METRICS.count("logically_prune.out", len(need_processing))
 
     end_time = time.time()
     print("pruning: {}".format(end_time - start_time))
@@ -368,10 +1147,11 @@ def logically_prune(learned_clauses, solutions, base_clauses_with_cats):
     return valid_clauses, need_processing
 
 
-def prune_validities(valid_clauses, base_clauses):
+def prune_validities(valid_clauses, base_clauses, session=None, all_kernels=False):
     """
     :param valid_clauses: set of frozensets
-    :return: pruned set of frozensets
+    :param all_kernels: keep every minimal valid subclause of a validity, not just one
+    :return: pruned ClauseSet
     """
     # This function should bring down the number of valid clauses. Some of them might be redundant in the sense
     # that they are supersets of a "core" validity. E.g. if (a, -b, -c, d) and (e, -b,-c,f) and (-b,-c) are
@@ -379,34 +1159,183 @@ def prune_validities(valid_clauses, base_clauses):
     # can be removed. So this function should loop over the validities by length starting with the shortest and
     # for each validity, check for its supersets. The supersets should then be removed.
     # This approach may be to radical but for now I would do it this way, can be adjusted if needed.
-    kernel = set()
-    for clause, base in valid_clauses:
+    kernel = ClauseSet()
+    if session is None:
+        session = SubprocessSession()
+    to_check = []
+    # a fixed order, so the queries, and with them the cores of an incremental solver, do not depend on
+    # the order in which the validities were found
+    for clause, base in sorted(valid_clauses, key=lambda pair: sorted(pair[0])):
         if not base:
-            kernel.update(essential_check(clause, base_clauses))
+            to_check.append(clause)
         else:
             kernel.add(base)
+    for smallest_clauses, calls in map_queries(partial(essential_query, all_kernels=all_kernels), to_check, session):
+        kernel.update(smallest_clauses)
+        METRICS.count("calls.essential", calls)
+    METRICS.count("prune_validities.in", len(valid_clauses))
+    METRICS.count("prune_validities.out", len(kernel))
     print("valid_clauses={}".format(len(valid_clauses)))
     print("valid_kernel={}".format(len(kernel)))
     return kernel
 
-def heuristically_prune(learned_clauses):
+def heuristically_prune(learned_clauses, counts, min_count):
     """
 
     :param learned_clauses: a set of sets of learned clauses from n runs on n different Sudokus
-    :return: the heuristically pruned set of learned clauses
+    :param counts: a CountMinSketch from clause_sketch with the number of puzzles each clause was learnt on
+    :param min_count: the x below
+    :return: the heuristically pruned ClauseSet of learned clauses and a ClauseSet of the dropped ones
     """
 
     # If logical pruning is insufficient we could prune heuristically. If we hardly ever learn a
     # clause, it in all likelihood would not help the SAT-solver much (this is itself a hypothesis
     # we could possibly test). Thus we could throw out all clauses that appear at a rate of less
     # than x/n, where n is the number of sudokus.
-    pass
+    kept = ClauseSet()
+    dropped = ClauseSet()
+    learned_clauses = list(learned_clauses)
+    for clause, count in zip(learned_clauses, counts.counts(learned_clauses)):
+        if count >= min_count:
+            kept.add(clause)
+        else:
+            dropped.add(clause)
+    print("heuristic pruning: puzzles={}, kept={}, dropped={}".format(counts.puzzles, len(kept), len(dropped)))
+    METRICS.count("heuristically_prune.in", len(learned_clauses))
+    METRICS.count("heuristically_prune.out", len(kept))
+    return kept, dropped
+
+
+def sample_dropped(dropped, session, sample_size, seed=0):
+    """
+    Checks a random sample of the clauses heuristically_prune dropped, to estimate how many validities
+    the pruning misses.
+
+    :return: set of (clause, 0) for the valid clauses in the sample
+    """
+    sample = random.Random(seed).sample(list(dropped), min(sample_size, len(dropped)))
+    valid_clauses = set((clause, 0) for clause, valid in zip(sample, map_queries(query_validity, sample, session))
+                        if valid)
+    METRICS.count("calls.validity", len(sample))
+    estimate = len(valid_clauses) * len(dropped) / float(len(sample)) if sample else 0.0
+    print("heuristic pruning: solver calls saved={}, sampled={}, valid in sample={}, estimated missed validities={:.1f}"
+          .format(len(dropped) - len(sample), len(sample), len(valid_clauses), estimate))
+    return valid_clauses
 
 
-def classify_validities(base_clauses_with_cats, valid_clauses):
+def binary_validities(base_clauses, backend=None, variables=LAST_VARIABLE, symmetric=False, info=None):
+    """
+    Derives every valid clause of one or two literals over the variables 1..variables by failed-literal
+    probing, without any puzzles.
+
+    (-l m) is valid exactly if the literal l implies m. Unit propagation of l gives part of the implied
+    literals for free, and every model found on the way rules out candidates for all literals at once: m
+    can only be implied by l if it is true in every model seen so far in which l is true. The remaining
+    candidates of l are settled by asking for a model of l in which one of them is false, through a
+    clause guarded by a fresh activation literal: if there is none, all of them are implied, otherwise
+    the model drops some and the call is repeated. A literal that is true in no model is a failed
+    literal and gives the unit validity -l.
+
+    On an encoding that the Sudoku symmetries map onto itself all v(i, j, d) are alike, so only v(1, 1, 1)
+    and its negation are probed and their implications carried to the other variables. This matters for
+    the minimal encoding, where refuting the implied literals takes a pigeonhole argument per literal.
+
+    :param backend: the solver backend, see open_session
+    :param variables: the literals over variables 1..variables are probed, by default the v(i, j, d)
+    :param symmetric: the encoding is one of SYMMETRIC_ENCODINGS
+    :param info: the file the summary is printed to, by default stdout
+    :return: a ClauseSet of the valid clauses that are not already base clauses, and the number of solver calls
     """
-    :param base_clauses_with_cats: a ditionary with classes as keys and sets of sets as values
+    base_clauses = [[int(x) for x in clause] for clause in base_clauses]
+    simplifier = Simplifier(base_clauses)
+    workdir = tempfile.mkdtemp(prefix="sudoku_probe_")
+    session = open_session(base_clauses, backend, workdir=workdir)
+    activation = itertools.count(simplifier.number_of_variables + 1)
+    literals = list(range(1, variables + 1)) + list(range(-1, -variables - 1, -1))
+    probes = [v(1, 1, 1), -v(1, 1, 1)] if symmetric else literals
+
+    def index(literal):
+        return literal - 1 if literal > 0 else variables - literal - 1
+
+    # common[index(l)] holds the literals true in every model seen so far in which l is true
+    common = np.zeros((2 * variables, 2 * variables), dtype=bool)
+    seen = np.zeros(2 * variables, dtype=bool)
+
+    def add_model(model):
+        row = np.zeros(2 * variables, dtype=bool)
+        row[[index(literal) for literal in model if abs(literal) <= variables]] = True
+        common[row & ~seen] = row
+        common[row & seen] &= row
+        seen[row] = True
+
+    calls = 0
+    units = set()
+    implied = {}
+    try:
+        for literal in probes:
+            propagated = simplifier.simplify([literal] + [-x for x in units])
+            if propagated is not None and not seen[index(literal)]:
+                satisfied, model, _ = session.solve([literal])
+                calls += 1
+                if satisfied:
+                    add_model(model)
+                else:
+                    propagated = None
+            if propagated is None:
+                units.add(literal)
+                session.add_clauses([[-literal]])
+                continue
+            found = set(x for x in propagated[2] if abs(x) <= variables and x != literal)
+            candidates = set(literals[i] for i in np.flatnonzero(common[index(literal)])) - found - {literal}
+            while candidates:
+                guard = next(activation)
+                session.add_clauses([[-guard] + [-x for x in candidates]])
+                satisfied, model, _ = session.solve([literal, guard])
+                session.add_clauses([[-guard]])
+                calls += 1
+                if not satisfied:
+                    found.update(candidates)
+                    # the proven clauses make the later refutations easier
+                    session.add_clauses([[-literal, x] for x in candidates])
+                    break
+                add_model(model)
+                candidates.intersection_update(model)
+            implied[literal] = found
+    finally:
+        session.close()
+        shutil.rmtree(workdir, True)
+    if symmetric:
+        for variable in range(1, variables + 1):
+            image = symmetry_moving(variable)
+            for literal in probes:
+                if literal in units:
+                    units.add(image(literal))
+                elif literal in implied:
+                    implied[image(literal)] = set(image(x) for x in implied[literal])
+
+    base = set(frozenset(clause) for clause in base_clauses)
+    valid_clauses = ClauseSet()
+    for literal in sorted(units, key=abs):
+        if frozenset([-literal]) not in base:
+            valid_clauses.add(frozenset([-literal]))
+    for literal in literals:
+        for other in sorted(implied.get(literal, ()), key=abs):
+            clause = frozenset([-literal, other])
+            # clauses containing a valid unit are subsumed by it
+            if clause not in base and not (units & set(-x for x in clause)):
+                valid_clauses.add(clause)
+    print("binary validities: literals={}, failed={}, valid clauses={}, solver calls={}".format(
+        len(literals), len(units), len(valid_clauses), calls), file=info or sys.stdout)
+    METRICS.count("calls.probe", calls)
+    return valid_clauses, calls
+
+
+def classify_validities(base_clauses_with_cats, valid_clauses, orbits=None):
+    """
+    :param base_clauses_with_cats: a ditionary with classes as keys and sets of sets as values, or its
+                                   SubsumptionIndex
     :param valid_clauses: the set of valid_clauses
+    :param orbits: an OrbitCache from sudoku_symmetry; if given, only one clause per orbit is classified
     :return: A set of classes of validities
     """
     # type of valid_clauses: set of strings. Strings need to be transformed since they are horrible for
@@ -422,44 +1351,104 @@ def classify_validities(base_clauses_with_cats, valid_clauses):
     cats = ["vcell", "ucell", "vrow", "urow", "vcol", "ucol", "vblock", "ublock", "new"]
     valid_dict = {cat: [] for cat in cats}
     # Comparing valid clauses and base clauses
+    index = subsumption_index(base_clauses_with_cats)
+    if orbits is not None:
+        valid_clauses = orbits.representatives(valid_clauses)
     for clause in valid_clauses:
         is_new_type = True
-        for key in base_clauses_with_cats:
-            for baseclause in base_clauses_with_cats[key]:
-                if baseclause.issubset(clause):
-                    valid_dict[key].append((clause, baseclause))
-                    is_new_type = False
+        for key, baseclause in index.subsets(clause):
+            valid_dict[key].append((clause, baseclause))
+            is_new_type = False
         if is_new_type:
             valid_dict["new"].append((clause, 0))
     return valid_dict
 
-def essential_check(clause_to_check, base_clauses):
-    essential = set()
-    not_essential = set()
-    clause = frozenset(clause_to_check)
-
-    comb = [frozenset(x) for x in itertools.combinations(clause, len(clause)-1)]
-
-    for subset_clause in comb:
-        if is_clause_valid(subset_clause, base_clauses):
-            not_essential.update(clause.difference(subset_clause))
-
-    essential.update(clause.difference(not_essential))
-    essential = frozenset(essential)
-    not_essential = frozenset(not_essential)
-
-    found_smallest = False
-    smallest_clauses = set()
-    for i in range(0, len(not_essential)):
-        comb = [frozenset(x) for x in itertools.combinations(not_essential, i)]
-        for subset_clause in comb:
-            check_clause = frozenset(essential.union(subset_clause))
-            if is_clause_valid(check_clause, base_clauses):
-                found_smallest = True
-                smallest_clauses.add(check_clause)
-        if found_smallest:
-            break
-    return smallest_clauses
+def minimal_kernel(clause, session):
+    """
+    Deletion based minimisation: drops the literals of a valid clause one at a time and keeps a literal
+    only if the clause without it is no longer valid. Whenever a check succeeds, the clause shrinks to
+    the unsat core the solver reports, which skips the literals the refutation did not need.
+
+    :return: a valid subset of the clause from which no literal can be removed, None if the clause is not
+             valid; at most len(clause) + 1 solver calls
+    """
+    core = session.valid_core(clause)
+    if core is None:
+        return None
+    kernel = sorted(core)
+    position = 0
+    while position < len(kernel):
+        core = session.valid_core(kernel[:position] + kernel[position + 1:])
+        if core is None:
+            # the literal is essential, and stays so in every subset of the kernel
+            position += 1
+        else:
+            kernel = [literal for literal in kernel if literal in core]
+    return frozenset(kernel)
+
+
+def all_minimal_kernels(clause, session):
+    """
+    Enumerates every minimal valid subset of the clause with a hitting set tree: once a kernel is found,
+    each of its literals is removed in turn and the rest is searched for further kernels. The number of
+    kernels, and so of solver calls, can grow exponentially with the length of the clause.
+
+    :return: set of frozensets
+    """
+    kernels = set()
+    seen = set()
+    stack = [frozenset(clause)]
+    while stack:
+        subclause = stack.pop()
+        if subclause in seen:
+            continue
+        seen.add(subclause)
+        kernel = next((kernel for kernel in kernels if kernel <= subclause), None)
+        if kernel is None:
+            kernel = minimal_kernel(subclause, session)
+            if kernel is None:
+                continue
+            kernels.add(kernel)
+        stack.extend(subclause - {literal} for literal in kernel)
+    return kernels
+
+
+def essential_check(clause_to_check, base_clauses, session=None, all_kernels=False):
+    """
+    :param all_kernels: return every minimal valid subclause instead of a single one
+    :return: set of minimal valid subclauses of the clause
+    """
+    if session is None:
+        session = SubprocessSession()
+    if all_kernels:
+        return all_minimal_kernels(clause_to_check, session)
+    kernel = minimal_kernel(clause_to_check, session)
+    return set() if kernel is None else {kernel}
+
+class CallCounter(object):
+    """
+    Passes validity queries on to a session and counts them, also inside SessionPool workers.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.calls = 0
+
+    def is_valid(self, clause):
+        self.calls += 1
+        return self.session.is_valid(clause)
+
+    def valid_core(self, clause):
+        self.calls += 1
+        return self.session.valid_core(clause)
+
+
+def essential_query(clause, session, all_kernels=False):
+    """
+    :return: the minimal valid subclauses and the number of solver calls it took
+    """
+    counter = CallCounter(session)
+    return essential_check(clause, None, counter, all_kernels), counter.calls
 
 def get_number_decisions():
     pattern = re.compile("decisions")
@@ -480,25 +1469,38 @@ def decode_clause(clause):
     sudoku = ''.join(str(e) for e in b)
     print(sudoku)
 
-def process_sudokus(list_of_sudokus):
+def solve_sudoku(sudoku, session):
+    instance_clauses = read_sudoku(sudoku)
+    # the givens are only part of the formula for this call, and a fresh solver keeps the decisions of a
+    # puzzle independent of the puzzles solved before it
+    satisfied, solution, learnt = session.solve_fresh([clause[0] for clause in instance_clauses])
+    if not satisfied:
+        raise Exception("All sudokus should be satisfiable")
+    return solution, learnt, session.stats.get("decisions", 0)
+
+def process_sudokus(list_of_sudokus, session=None, counts=None):
+    """
+    :param counts: a CountMinSketch from clause_sketch; if given, every learnt clause is counted once per puzzle
+    """
     start_time = time.time()
     no_decisions = 0
-    learnt_clauses = set()
-    solutions = set()
-    for index, sudoku in enumerate(list_of_sudokus):
-        instance_clauses = read_sudoku(sudoku)
-        # solve using MiniSAT
-        add_to_base_dimacs(instance_clauses)
-        ret = call(COMMAND % (DIMACS_OUT, MINISAT_OUT, LOGFILE), shell=True)
-        satisfied, solution, learnt = read_results(ret, MINISAT_OUT, LOGFILE)
-        if not satisfied:
-            raise Exception("All sudokus should be satisfiable")
+    learnt_clauses = ClauseSet()
+    solutions = ClauseSet()
+    if session is None:
+        session = SubprocessSession()
+    list_of_sudokus = list(list_of_sudokus)
+    METRICS.count("calls.solve", len(list_of_sudokus))
+    for solution, learnt, decisions in map_queries(solve_sudoku, list_of_sudokus, session):
         if learnt:
             learnt_clauses.update(learnt)
-        remove_x_lines_from_base_dimacs(number_of_lines=len(instance_clauses))
+        if counts is not None:
+            counts.update(learnt)
+            counts.puzzles += 1
         solutions.add(solution)
-        no_decisions = no_decisions + get_number_decisions()
+        no_decisions = no_decisions + decisions
 
+    METRICS.count("process_sudokus.learnt", len(learnt_clauses))
+    METRICS.count("process_sudokus.decisions", no_decisions)
     end_time = time.time()
     print("processing batch of len={}, time={}".format(len(list_of_sudokus), end_time - start_time))
     return learnt_clauses, solutions, no_decisions
@@ -514,18 +1516,30 @@ def get_batches(number_of_batches, length_of_list):
 def create_base_dimacs(clauses):
     dimacs_out(filename=DIMACS_OUT, clauses=clauses)
 
-def add_to_base_dimacs(clauses):
-    with open(DIMACS_OUT, "a") as fileobj:
-        for clause in clauses:
-            line = " ".join([str(literal) for literal in clause]) + " 0\n"
-            fileobj.write(line)
+def add_to_base_dimacs(clauses, session=None):
+    if session is not None:
+        session.add_clauses(clauses)
+    else:
+        append_dimacs(DIMACS_OUT, clauses)
 
-def remove_x_lines_from_base_dimacs(number_of_lines):
-    with open(DIMACS_OUT, "r") as fileobj:
-        lines = fileobj.readlines()
-        lines = lines[:-number_of_lines]
-    with open(DIMACS_OUT, "w") as fileobj:
-        fileobj.writelines(lines)
+def append_dimacs(filename, clauses, body=None):
+    """
+    :param body: the DIMACS bytes of the clauses and their largest variable, if dimacs_body already ran
+    """
+    if body is None:
+        clauses = list(clauses)
+        body = dimacs_body(clauses)
+    body, number_of_variables = body
+    with open(filename, "r+b") as fileobj:
+        header = fileobj.readline()
+        fileobj.seek(0, os.SEEK_END)
+        fileobj.write(body)
+        METRICS.count("dimacs.bytes", len(body))
+        if header.startswith(b"p cnf") and len(header) == len(dimacs_header(0, 0)):
+            # the header has a fixed width, so the counts are updated without rewriting the file
+            _, _, variables, count = header.split()
+            fileobj.seek(0)
+            fileobj.write(dimacs_header(max(int(variables), number_of_variables), int(count) + len(clauses)))
 
 def write_validities_to_file(interval_from, interval_to, encoding, validities, batch_size):
     filename = "_".join([str(interval_from),
@@ -535,23 +1549,49 @@ def write_validities_to_file(interval_from, interval_to, encoding, validities, b
                         str(batch_size),
                         "validities.txt"
                         ])
+    write_clauses(filename, validities)
+
+def write_clauses(filename, clauses):
     with open(filename, "w+") as fileobj:
-        for clause in validities:
+        for clause in clauses:
             line = " ".join([str(literal) for literal in clause]) + "\n"
             fileobj.write(line)
 
 def main(argv=None):
     if argv is None:
         argv = sys.argv
-    opts, args = getopt.getopt(argv[1:], "hp:t:l:b:i:v:",
-    ["help", "problem", "train", "limit", "batch", "interval", "validities"])
+    opts, args = getopt.getopt(argv[1:], "hp:t:l:b:i:v:s:j:e:",
+    ["help", "problem", "train", "limit", "batch", "interval", "validities", "solver=", "jobs=", "encoding=",
+     "simplify", "orbits", "cache=", "all-kernels", "index=", "metrics=", "profile=", "resume", "min-count=", "prune-sample=", "pipeline",
+     "binaries=", "portfolio=", "serve", "socket="])
 
     # option processing
     batch = 1
     limit = 0
     interval_from = 0
     interval_to = 0
-    validities = set()
+    validities = []
+    validity_files = []
+    backend = None
+    jobs = 1
+    encoding = "extended"
+    simplify = False
+    orbits = None
+    cache_file = None
+    all_kernels = False
+    index_file = None
+    profile_file = None
+    resume = False
+    min_count = 1
+    prune_sample = 50
+    pipeline = False
+    binaries_file = None
+    portfolio_spec = None
+    serve = any(option in ("--serve", "--socket") for option, _ in opts)
+    socket_path = None
+    puzzle_file = None
+    # stdout carries the answers of --serve, so the status output goes to stderr then
+    info = sys.stderr if serve else sys.stdout
     for option, value in opts:
         if option in ("-h", "--help"):
             raise Usage(help_message)
@@ -561,69 +1601,264 @@ def main(argv=None):
             batch = int(value)
         if option in ("-i", "--interval"):
             values = [int(x) for x in value.strip().split(":")]
-            print(values)
+            print(values, file=info)
             interval_from, interval_to = values[0], values[1]
+        if option in ("-s", "--solver"):
+            backend = value
+        if option in ("-j", "--jobs"):
+            jobs = int(value)
+        if option in ("-e", "--encoding"):
+            if value not in ENCODINGS:
+                raise Usage("unknown encoding: {}".format(value))
+            encoding = value
+        if option == "--simplify":
+            simplify = True
+        if option == "--orbits":
+            orbits = OrbitCache()
+        if option == "--cache":
+            cache_file = value
+        if option == "--all-kernels":
+            all_kernels = True
+        if option == "--index":
+            index_file = value
+        if option == "--metrics":
+            METRICS.open(value)
+        if option == "--profile":
+            profile_file = value
+        if option == "--resume":
+            resume = True
+        if option == "--min-count":
+            min_count = int(value)
+        if option == "--prune-sample":
+            prune_sample = int(value)
+        if option == "--pipeline":
+            pipeline = True
+        if option == "--binaries":
+            binaries_file = value
+        if option == "--portfolio":
+            portfolio_spec = value
+        if option == "--socket":
+            socket_path = value
         if option in ("-t", "--train", "-p", "--problem"):
-            with open(value) as fileobj:
-                file_as_list = list(fileobj)
+            puzzle_file = value
         if option in ("-v", "--validities"):
-            with open(value) as fileobj:
-                lines = fileobj.readlines()
-                for line in lines:
-                    validities.add(frozenset(line.strip().split()))
+            validity_files.append(value)
+    if puzzle_file is None and binaries_file is None and not serve:
+        raise Usage(help_message)
+    # --binaries and --serve on their own need no puzzles
+    puzzles = PuzzleSource(puzzle_file, index_file) if puzzle_file else None
     if limit:
         interval_to = limit
-    if not interval_to:
-        interval_to = len(file_as_list)
-    file_as_list = file_as_list[interval_from:interval_to]
-    print("interval_from={}, interval_to={}".format(interval_from, interval_to))
-    print("limit={}".format(limit))
-    print("batch={}".format(batch))
-
-    #base_clauses = sudoku_clauses()
-    base_clauses = extended_sudoku_clauses()
-    #base_clauses = minimal_sudoku_clauses()
-    encoding = "minimal"
-    create_base_dimacs(base_clauses)
+    if not interval_to and puzzles is not None:
+        interval_to = len(puzzles)
+    number_of_puzzles = max(0, min(interval_to, len(puzzles)) - interval_from) if puzzles is not None else 0
+    print("interval_from={}, interval_to={}".format(interval_from, interval_to), file=info)
+    print("limit={}".format(limit), file=info)
+    print("batch={}".format(batch), file=info)
+
+    print("encoding={}".format(encoding), file=info)
+    for filename in validity_files:
+        # text files or clause libraries, see clause_library.py
+        try:
+            validities.append(load_clauses(filename, encoding))
+        except ValueError as err:
+            raise Usage(str(err))
+
+    encoding_clauses, encoding_clauses_with_cats = ENCODINGS[encoding]
+    if pipeline and min_count > 1:
+        raise Usage("--min-count counts over whole batches and cannot be combined with --pipeline")
+    if orbits is not None and encoding not in SYMMETRIC_ENCODINGS:
+        raise Usage("--orbits needs an encoding that is invariant under the Sudoku symmetries")
+    base_clauses = encoding_clauses()
+    cache = None
+    if cache_file:
+        cache = ValidityCache(cache_file, encoding_fingerprint(base_clauses),
+                              canonical=orbits.key if orbits is not None else None)
+    session = open_session(base_clauses, backend, simplify=simplify)
     if validities:
-        add_to_base_dimacs(validities)
-
+        add_to_base_dimacs(ClauseBlock.concatenate(validities), session)
+    if binaries_file:
+        print("Probing binary validities", file=info)
+        with METRICS.stage("probe"):
+            binaries, _ = binary_validities(base_clauses, session.backend,
+                                            symmetric=encoding in SYMMETRIC_ENCODINGS, info=info)
+        write_clauses(binaries_file, binaries)
+        # later training and solving in this run start from them as well
+        add_to_base_dimacs(binaries, session)
+        METRICS.emit("binaries", validities=len(binaries))
+
+    if serve:
+        from solve_service import SolveService
+        service = SolveService(session)
+        if socket_path:
+            service.serve_socket(socket_path)
+        else:
+            service.serve_stream(sys.stdin, sys.stdout)
+
+    profiler = None
+    if profile_file:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    # built once, the index does not change while the validities are added to the sessions
+    base_clauses_with_cats = SubsumptionIndex(encoding_clauses_with_cats())
     for option, value in opts:
-        base_clauses_with_cats = extended_sudoku_clauses_with_cats()
         if option in ("-t", "--train"):
-            solutions = set()
+            solutions = SolutionMatrix()
 
             print("Training:")
-            global_validities = set()
-
-            for start_partition, end_partition in get_batches(number_of_batches=batch, length_of_list=len(file_as_list)):
-                learnt_clauses, new_solutions, _ = process_sudokus(file_as_list[start_partition:end_partition])
-                solutions.update(new_solutions)
-
-                valid_clauses = set()
-                valid_clauses_pruned, need_processing = logically_prune(learnt_clauses, solutions, base_clauses_with_cats)
-                valid_clauses.update(valid_clauses_pruned)
-                print("Checking Validities")
-                new_valid_clauses = check_validity(need_processing, base_clauses)
-                valid_clauses.update(new_valid_clauses)
+            global_validities = ClauseSet()
+            totals = {"puzzles": 0, "decisions": 0, "learnt": 0, "checked": 0, "seconds": 0.0}
+            batches_done = 0
+            counts = CountMinSketch() if min_count > 1 else None
+            # a checkpoint is written after every batch and removed once the validities are written
+            checkpoint_file = checkpoint_name(interval_from, interval_to, encoding, batch)
+            settings = {"puzzles": os.path.abspath(puzzle_file), "interval_from": interval_from,
+                        "interval_to": interval_to, "batch": batch, "encoding": encoding,
+                        "min_count": min_count}
+            if resume and os.path.exists(checkpoint_file):
+                try:
+                    batches_done, solutions, global_validities, totals = load_checkpoint(checkpoint_file, settings, counts)
+                except ValueError as err:
+                    raise Usage(str(err))
+                print("resuming after batch {} of {}, validities={}".format(batches_done, batch,
+                                                                           len(global_validities)))
+                # the base formula of the interrupted run was the encoding plus these validities
+                add_to_base_dimacs(global_validities, session)
+            elif resume:
+                print("no checkpoint {}, starting from the first batch".format(checkpoint_file))
+            # training needs the learnt clauses, which not every backend reports
+            solve_session = session
+            if not session.reports_learnt:
+                # copies the base formula including the validities of a resumed run
+                solve_session = SubprocessSession(session.clauses)
+                solve_session.simplify = simplify
+            solve_pool = SessionPool(solve_session, jobs)
+            validity_pool = solve_pool if solve_session is session else SessionPool(session, jobs)
+            # the kernels are minimised on a session of their own, so that the cores of an incremental solver
+            # only depend on the kernel queries and not on how many validity checks ran before
+            kernel_session = session
+            if session.backend != "minisat":
+                kernel_session = open_session(session.clauses, session.backend)
+            kernel_pool = SessionPool(kernel_session, jobs)
+            slots = None
+            if pipeline:
+                from training_pipeline import SolverSlots, solve_and_check
+                slots = SolverSlots(solve_session.backend, solve_session.clauses, jobs, simplify)
+
+            batches = get_batches(number_of_batches=batch, length_of_list=number_of_puzzles)
+            for batch_number, (start_partition, end_partition) in enumerate(batches):
+                if batch_number < batches_done:
+                    continue
+                batch_start_time = time.time()
+                # only the lines of the current batch are read from the file
+                with METRICS.stage("read"):
+                    batch_of_puzzles = puzzles.lines(interval_from + start_partition, interval_from + end_partition)
+                if pipeline:
+                    # solving overlaps with pruning and checking the clauses of the puzzles solved so far
+                    with METRICS.stage("pipeline"):
+                        result = solve_and_check(batch_of_puzzles, slots, solutions, base_clauses_with_cats,
+                                                 base_clauses, validity_pool, orbits, cache)
+                    valid_clauses = result["valid_clauses"]
+                    decisions, learnt, checked = result["decisions"], result["learnt"], result["checked"]
+                else:
+                    with METRICS.stage("solve"):
+                        learnt_clauses, new_solutions, decisions = process_sudokus(batch_of_puzzles,
+                                                                                   solve_pool, counts)
+                        solutions.update(new_solutions)
+
+                    valid_clauses = set()
+                    with METRICS.stage("logically_prune"):
+                        valid_clauses_pruned, need_processing = logically_prune(learnt_clauses, solutions, base_clauses_with_cats)
+                    valid_clauses.update(valid_clauses_pruned)
+                    if counts is not None:
+                        with METRICS.stage("heuristically_prune"):
+                            need_processing, dropped = heuristically_prune(need_processing, counts, min_count)
+                            # the sampled clauses that turn out valid are kept
+                            valid_clauses.update(sample_dropped(dropped, validity_pool, prune_sample, batch_number))
+                    print("Checking Validities")
+                    with METRICS.stage("check_validity"):
+                        new_valid_clauses = check_validity(need_processing, base_clauses, validity_pool, orbits, cache)
+                    valid_clauses.update(new_valid_clauses)
+                    learnt, checked = len(learnt_clauses), len(need_processing)
                 print("Pruning Validities")
-                valid_clauses_kernel = prune_validities(valid_clauses, base_clauses)
+                with METRICS.stage("prune_validities"):
+                    valid_clauses_kernel = prune_validities(valid_clauses, base_clauses, kernel_pool, all_kernels)
                 global_validities.update(valid_clauses_kernel)
-                add_to_base_dimacs(valid_clauses_kernel)
+                with METRICS.stage("add_to_base"):
+                    add_to_base_dimacs(valid_clauses_kernel, session)
+                    if solve_session is not session:
+                        add_to_base_dimacs(valid_clauses_kernel, solve_session)
+                    if kernel_session is not session:
+                        add_to_base_dimacs(valid_clauses_kernel, kernel_session)
+                    if slots is not None:
+                        slots.add_clauses(valid_clauses_kernel)
+                totals["puzzles"] += len(batch_of_puzzles)
+                totals["decisions"] += decisions
+                totals["learnt"] += learnt
+                totals["checked"] += checked
+                totals["seconds"] += time.time() - batch_start_time
+                with METRICS.stage("checkpoint"):
+                    save_checkpoint(checkpoint_file, batch_number + 1, solutions, global_validities, totals, settings,
+                                    counts)
+                METRICS.emit("batch", batch=batch_number, start=interval_from + start_partition,
+                             end=interval_from + end_partition, validities=len(global_validities))
 
             print("Classifying Validities")
-            classified_validities = classify_validities(base_clauses_with_cats=base_clauses_with_cats,
-                                                        valid_clauses=global_validities)
+            with METRICS.stage("classify"):
+                classified_validities = classify_validities(base_clauses_with_cats=base_clauses_with_cats,
+                                                            valid_clauses=global_validities)
             for key in classified_validities:
                 print("key={}, len={}".format(key, len(classified_validities[key])))
                 if key == "new" and len(classified_validities[key]) > 0:
                     print(classified_validities[key])
+            if orbits is not None:
+                classified_orbits = classify_validities(base_clauses_with_cats=base_clauses_with_cats,
+                                                        valid_clauses=global_validities, orbits=orbits)
+                for key in classified_orbits:
+                    print("key={}, orbits={}".format(key, len(classified_orbits[key])))
+            print("totals: {}".format(", ".join("{}={}".format(key, totals[key]) for key in sorted(totals))))
             write_validities_to_file(interval_from, interval_to, encoding, global_validities, batch)
-
-        if option in ("-p", "--problem"):
+            if os.path.exists(checkpoint_file):
+                os.remove(checkpoint_file)
+            METRICS.emit("train", validities=len(global_validities))
+            solve_pool.close()
+            validity_pool.close()
+            kernel_pool.close()
+            if solve_session is not session:
+                solve_session.close()
+            if kernel_session is not session:
+                kernel_session.close()
+            if slots is not None:
+                slots.close()
+
+        if option in ("-p", "--problem") and portfolio_spec:
+            from portfolio import Portfolio, parse_portfolio, race_sudokus
+            portfolio = Portfolio(parse_portfolio(portfolio_spec), backend, simplify)
+            with METRICS.stage("solve"):
+                solutions, no_decisions = race_sudokus(puzzles.lines(interval_from, interval_to), portfolio)
+            print("number of decisions = {}".format(no_decisions))
+            METRICS.emit("problem", start=interval_from, end=interval_to)
+            portfolio.close()
+        elif option in ("-p", "--problem"):
             # iterate over the set of sudoku problems
-            learnt_clauses, solutions, no_decisions = process_sudokus(file_as_list)
+            solve_pool = SessionPool(session, jobs)
+            with METRICS.stage("solve"):
+                learnt_clauses, solutions, no_decisions = process_sudokus(puzzles.lines(interval_from, interval_to), solve_pool)
             print("number of decisions = {}".format(no_decisions))
+            METRICS.emit("problem", start=interval_from, end=interval_to)
+            solve_pool.close()
+
+    if profiler is not None:
+        # only the main process is profiled, time spent in SessionPool workers shows up as waiting
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        pstats.Stats(profile_file).sort_stats("cumulative").print_stats(20)
+    if cache is not None:
+        cache.close()
+    METRICS.close()
+    if puzzles is not None:
+        puzzles.close()
+    session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+"""
+sudoku_symmetry.py
+
+Canonical forms of clauses over the v(i, j, d) variables under the symmetry group of the Sudoku
+encodings: permuting the bands, the stacks, the rows within a band and the columns within a stack,
+transposing the grid and relabelling the digits. Every one of these maps the minimal, efficient and
+extended encodings onto themselves, so a clause is valid if and only if its image is. Validity only
+has to be decided once per orbit, the set of all images of a clause, which OrbitCache keeps track of.
+
+The canonical form is the image whose literals, as (row, column, digit, sign) keys, sort smallest.
+It is found by a branch and bound search that places the literals one at a time, always mapping the
+rows, columns and digits of the next literal to the smallest values that are still free.
+"""
+
+from sudoku_encodings import v, v_inv
+
+LAST_VARIABLE = 729
+# clauses whose search takes more nodes than this stay their own canonical form
+MAX_NODES = 20000
+
+
+def _keys(clause):
+    keys = []
+    for literal in clause:
+        i, j, d = v_inv(abs(literal))
+        keys.append((i - 1, j - 1, d - 1, 1 if literal > 0 else 0))
+    return keys
+
+
+def _literal(key):
+    row, column, digit, sign = key
+    variable = v(row + 1, column + 1, digit + 1)
+    return variable if sign else -variable
+
+
+def _lowest_free(mask, start, stop):
+    return next((x for x in range(start, stop) if not mask >> x & 1), -1)
+
+
+# FREE_ROW[used][band]: the smallest row of the band not in the bit mask of used rows
+FREE_ROW = [[_lowest_free(used, 3 * band, 3 * band + 3) for band in range(3)] for used in range(512)]
+# FREE_BAND[used]: the first row of the smallest band not in the bit mask of used bands
+FREE_BAND = [3 * _lowest_free(used, 0, 3) for used in range(8)]
+
+
+class _Search(object):
+    """
+    Branch and bound over the placements of the literals. The state holds, for rows and for columns,
+    the image of every row (or -1), the image of every band, and bit masks of the images in use, plus
+    the image of every digit and the number of digits mapped so far.
+    """
+
+    def __init__(self):
+        self.best = None
+        self.nodes = 0
+
+    def run(self, keys):
+        state = ([-1] * 9, [-1] * 3, 0, 0, [-1] * 9, [-1] * 3, 0, 0, [-1] * 9, 0)
+        self._extend(keys, [], state)
+
+    def _extend(self, remaining, prefix, state):
+        self.nodes += 1
+        if self.nodes > MAX_NODES:
+            raise OverflowError
+        if not remaining:
+            if self.best is None or prefix < self.best:
+                self.best = list(prefix)
+            return
+        rows, bands, used_rows, used_bands, columns, stacks, used_columns, used_stacks, digits, used_digits = state
+        free_rows = FREE_ROW[used_rows]
+        free_columns = FREE_ROW[used_columns]
+        free_band = FREE_BAND[used_bands]
+        free_stack = FREE_BAND[used_stacks]
+        candidates = []
+        for key in remaining:
+            row, column, digit, sign = key
+            image_row = rows[row]
+            if image_row < 0:
+                band = bands[row // 3]
+                image_row = free_band if band < 0 else free_rows[band]
+            image_column = columns[column]
+            if image_column < 0:
+                stack = stacks[column // 3]
+                image_column = free_stack if stack < 0 else free_columns[stack]
+            image_digit = digits[digit]
+            if image_digit < 0:
+                image_digit = used_digits
+            candidates.append(((image_row, image_column, image_digit, sign), key))
+        smallest = min(candidates)[0]
+        depth = len(prefix)
+        if self.best is not None and prefix + [smallest] > self.best[:depth + 1]:
+            return
+        image_row, image_column, image_digit, _ = smallest
+        for image, key in candidates:
+            if image != smallest:
+                continue
+            row, column, digit, _ = key
+            new_rows, new_bands, new_columns, new_stacks, new_digits = rows[:], bands[:], columns[:], stacks[:], digits[:]
+            new_rows[row] = image_row
+            new_bands[row // 3] = image_row // 3
+            new_columns[column] = image_column
+            new_stacks[column // 3] = image_column // 3
+            new_digits[digit] = image_digit
+            new_state = (new_rows, new_bands, used_rows | 1 << image_row, used_bands | 1 << image_row // 3,
+                         new_columns, new_stacks, used_columns | 1 << image_column,
+                         used_stacks | 1 << image_column // 3,
+                         new_digits, max(used_digits, image_digit + 1))
+            self._extend([k for k in remaining if k is not key], prefix + [image], new_state)
+
+
+def canonical(clause):
+    """
+    :param clause: iterable of literals
+    :return: the canonical member of the clause's orbit as a frozenset; clauses with variables outside
+             v(i, j, d), and clauses too symmetric to search, are returned unchanged
+    """
+    clause = frozenset(clause)
+    if not clause or any(literal == 0 or abs(literal) > LAST_VARIABLE for literal in clause):
+        return clause
+    keys = _keys(clause)
+    search = _Search()
+    try:
+        search.run(keys)
+        search.run([(column, row, digit, sign) for row, column, digit, sign in keys])
+    except OverflowError:
+        return clause
+    return frozenset(_literal(key) for key in search.best)
+
+
+def _carry(target):
+    """
+    :return: a permutation of the rows (or columns) 0..8 that moves whole bands and rows within a band
+             and maps row 0 to target
+    """
+    band, offset = divmod(target, 3)
+    images = list(range(9))
+    for row in range(3):
+        images[row], images[3 * band + row] = images[3 * band + row], images[row]
+    first = 3 * band
+    return [first + offset if image == first else first if image == first + offset else image for image in images]
+
+
+def symmetry_moving(variable):
+    """
+    :return: a function that applies to a literal a symmetry mapping v(1, 1, 1) to the given variable
+    """
+    i, j, d = v_inv(variable)
+    rows, columns = _carry(i - 1), _carry(j - 1)
+    digits = list(range(9))
+    digits[0], digits[d - 1] = d - 1, 0
+
+    def apply(literal):
+        row, column, digit = v_inv(abs(literal))
+        image = v(rows[row - 1] + 1, columns[column - 1] + 1, digits[digit - 1] + 1)
+        return image if literal > 0 else -image
+    return apply
+
+
+class OrbitCache(object):
+    """
+    Validity verdicts per orbit. Keys are canonical forms, so a verdict found for one clause answers
+    the question for every image of it.
+    """
+
+    def __init__(self):
+        self.verdicts = {}
+        self._canonical = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, clause):
+        clause = frozenset(clause)
+        if clause not in self._canonical:
+            self._canonical[clause] = canonical(clause)
+        return self._canonical[clause]
+
+    def get(self, clause):
+        verdict = self.verdicts.get(self.key(clause))
+        if verdict is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return verdict
+
+    def add(self, clause, verdict):
+        self.verdicts[self.key(clause)] = verdict
+
+    def representatives(self, clauses):
+        """
+        :return: one member per orbit among the clauses, the smallest as sorted literals
+        """
+        members = {}
+        for clause in clauses:
+            key = self.key(clause)
+            if key not in members or sorted(clause) < sorted(members[key]):
+                members[key] = clause
+        return list(members.values())
@@ -0,0 +1,39 @@
+import os
+import itertools
+
+import pytest
+from pysat.solvers import Minisat22
+
+from sudoku_sat_solver import (ENCODINGS, LAST_VARIABLE, amo_pairwise, amo_sequential, amo_commander, amo_product,
+                               open_session, read_sudoku)
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")) as fileobj:
+    SUDOKUS = [line for line, _ in zip(fileobj, range(5))]
+
+
+@pytest.mark.parametrize("amo", [amo_pairwise, amo_sequential, amo_commander, amo_product])
+@pytest.mark.parametrize("n", range(1, 11))
+def test_accepts_exactly_at_most_one(amo, n):
+    literals = list(range(1, n + 1))
+    clauses = amo(literals, itertools.count(n + 1))
+    with Minisat22(bootstrap_with=clauses) as solver:
+        for values in itertools.product((False, True), repeat=n):
+            assumptions = [x if value else -x for x, value in zip(literals, values)]
+            assert solver.solve(assumptions=assumptions) == (sum(values) <= 1)
+
+
+@pytest.mark.parametrize("encoding", ["sequential", "commander", "product"])
+def test_sudoku_solutions_match_the_pairwise_encoding(encoding):
+    pairwise = open_session(ENCODINGS["efficient"][0](), "pysat")
+    compact = open_session(ENCODINGS[encoding][0](), "pysat")
+    try:
+        for sudoku in SUDOKUS:
+            units = [clause[0] for clause in read_sudoku(sudoku)]
+            satisfied, solution, _ = compact.solve(units)
+            assert satisfied
+            # the auxiliary variables come after the v(i, j, d)
+            grid = frozenset(literal for literal in solution if abs(literal) <= LAST_VARIABLE)
+            assert grid == pairwise.solve(units)[1]
+    finally:
+        pairwise.close()
+        compact.close()
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+import benchmark
+
+PUZZLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")
+
+
+@pytest.mark.parametrize("backend", ["pysat", "cdcl"])
+def test_records_do_not_depend_on_the_puzzles_before(backend):
+    sample = benchmark.sample_puzzles(PUZZLES, 8, seed=1)
+
+    def conflicts(records):
+        return dict((record["puzzle"], record["conflicts"]) for record in records)
+
+    forward = benchmark.run_configuration("minimal", "none", [], sample, backend)
+    backward = benchmark.run_configuration("minimal", "none", [], sample[::-1], backend)
+    twice = benchmark.run_configuration("minimal", "none", [], sample + sample, backend)
+    assert conflicts(forward) == conflicts(backward)
+    assert [record["conflicts"] for record in twice[:8]] == [record["conflicts"] for record in twice[8:]]
+
+
+def test_sample_leaves_out_the_excluded_lines():
+    sample = benchmark.sample_puzzles(PUZZLES, 100, seed=0, exclude=(10, 20))
+    numbers = [number for number, _ in sample]
+    assert numbers == sorted(numbers)
+    assert not [number for number in numbers if 10 <= number < 20]
@@ -0,0 +1,48 @@
+import random
+import itertools
+
+import pytest
+from pysat.solvers import Minisat22
+
+from sudoku_sat_solver import binary_validities, check_validity, open_session, minimal_sudoku_clauses, v
+
+
+def implied(solver, clause):
+    return not solver.solve(assumptions=[-x for x in clause])
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("backend", ["pysat", "cdcl"])
+def test_finds_exactly_the_short_validities(seed, backend):
+    # small random formulas, compared with asking the solver about every clause of one or two literals
+    rng = random.Random(seed)
+    variables = 8
+    clauses = [[rng.choice((-1, 1)) * x for x in rng.sample(range(1, variables + 1), rng.randint(2, 3))]
+               for _ in range(14)]
+    literals = list(range(1, variables + 1)) + list(range(-variables, 0))
+    found, _ = binary_validities(clauses, backend, variables=variables)
+    base = set(frozenset(clause) for clause in clauses)
+    with Minisat22(bootstrap_with=clauses) as solver:
+        if not solver.solve():
+            pytest.skip("unsatisfiable formula")
+        units = set(frozenset([x]) for x in literals if implied(solver, [x]))
+        pairs = set(frozenset(pair) for pair in itertools.combinations(literals, 2)
+                    if pair[0] != -pair[1] and implied(solver, pair))
+    # pairs subsumed by a valid unit and the base clauses themselves are left out
+    expected = units | set(pair for pair in pairs if not any(frozenset([x]) in units for x in pair)) - base
+    assert set(found) == expected
+
+
+def test_symmetric_probing_on_the_minimal_encoding():
+    clauses = minimal_sudoku_clauses()
+    found, calls = binary_validities(clauses, "pysat", symmetric=True)
+    found = list(found)
+    # the minimal encoding lacks the at most one digit per cell clauses, which are all implied
+    assert frozenset([-v(1, 1, 1), -v(1, 1, 2)]) in found
+    assert frozenset([-v(9, 9, 8), -v(9, 9, 9)]) in found
+    session = open_session(clauses, "pysat")
+    try:
+        sample = random.Random(0).sample(found, 8)
+        assert set(clause for clause, _ in check_validity(sample, clauses, session)) == set(sample)
+    finally:
+        session.close()
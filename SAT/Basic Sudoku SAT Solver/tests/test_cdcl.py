@@ -0,0 +1,78 @@
+import random
+
+import pytest
+from pysat.solvers import Minisat22
+
+import cdcl
+
+
+def random_cnf(rng, variables, ratio=4.26, width=3):
+    return [[rng.choice((-1, 1)) * rng.randint(1, variables) for _ in range(width)]
+            for _ in range(int(variables * ratio))]
+
+
+def pigeonhole(holes):
+    def v(pigeon, hole):
+        return pigeon * holes + hole + 1
+    clauses = [[v(pigeon, hole) for hole in range(holes)] for pigeon in range(holes + 1)]
+    for hole in range(holes):
+        for pigeon in range(holes + 1):
+            for other in range(pigeon + 1, holes + 1):
+                clauses.append([-v(pigeon, hole), -v(other, hole)])
+    return clauses
+
+
+def satisfies(model, clauses):
+    model = set(model)
+    return all(any(literal in model for literal in clause) for clause in clauses)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_models_agree_with_pysat(seed):
+    rng = random.Random(seed)
+    clauses = random_cnf(rng, rng.randint(5, 60))
+    solver = cdcl.Solver(clauses)
+    with Minisat22(bootstrap_with=clauses) as reference:
+        assert solver.solve() == reference.solve()
+    if solver.model is not None:
+        assert satisfies(solver.model, clauses)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_cores_under_assumptions(seed):
+    rng = random.Random(seed)
+    variables = rng.randint(10, 40)
+    clauses = random_cnf(rng, variables, ratio=3.5)
+    solver = cdcl.Solver(clauses)
+    with Minisat22(bootstrap_with=clauses) as reference:
+        # the same solver answers every call, so the learnt clauses of earlier calls are reused
+        for _ in range(10):
+            assumptions = [rng.choice((-1, 1)) * x for x in rng.sample(range(1, variables + 1), 6)]
+            satisfied = solver.solve(assumptions)
+            assert satisfied == reference.solve(assumptions=assumptions)
+            if satisfied:
+                assert satisfies(solver.model, clauses + [[x] for x in assumptions])
+            else:
+                assert set(solver.core) <= set(assumptions)
+                assert not reference.solve(assumptions=solver.core)
+
+
+def test_learnt_clauses_are_implied():
+    clauses = random_cnf(random.Random(0), 50)
+    learnt = []
+    cdcl.Solver(clauses).solve(on_learnt=learnt.append)
+    assert learnt
+    with Minisat22(bootstrap_with=clauses) as reference:
+        for clause in learnt:
+            assert not reference.solve(assumptions=[-x for x in clause])
+
+
+def test_reduction_compacts_the_arena():
+    clauses = pigeonhole(6)
+    solver = cdcl.Solver(clauses)
+    assert not solver.solve()
+    # learnt clauses were deleted, and none of them is left behind in the arena
+    assert len(solver._learnts) < solver.stats["conflicts"]
+    assert all(start >= 0 for start in solver._start)
+    assert len(solver._lits) == sum(solver._size)
+    assert len(solver._start) - len(solver._learnts) <= len(clauses)
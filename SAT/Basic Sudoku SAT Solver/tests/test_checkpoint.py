@@ -0,0 +1,48 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from checkpoint import save_checkpoint, load_checkpoint
+from clause_arrays import SolutionMatrix, ClauseSet
+from clause_sketch import CountMinSketch
+
+SETTINGS = {"interval": [0, 100], "batch": 10, "encoding": "minimal"}
+
+
+def random_state(seed):
+    rng = random.Random(seed)
+    solutions = SolutionMatrix([[x if rng.random() < 0.5 else -x for x in range(1, 730)] for _ in range(13)])
+    validities = ClauseSet([rng.choice((-1, 1)) * rng.randint(1, 729) for _ in range(rng.randint(1, 4))]
+                           for _ in range(300))
+    return solutions, validities
+
+
+def test_save_load_round_trip(tmp_path):
+    filename = str(tmp_path / "run_checkpoint.npz")
+    solutions, validities = random_state(0)
+    totals = {"puzzles": 30, "decisions": 1234, "seconds": 1.5}
+    counts = CountMinSketch(bits=8)
+    counts.update(list(validities)[:50])
+    counts.puzzles = 3
+    save_checkpoint(filename, 3, solutions, validities, totals, SETTINGS, counts)
+    assert not os.path.exists(filename + ".tmp")
+
+    loaded_counts = CountMinSketch(bits=8)
+    batches_done, loaded_solutions, loaded_validities, loaded_totals = load_checkpoint(filename, dict(SETTINGS),
+                                                                                       loaded_counts)
+    assert batches_done == 3
+    assert np.array_equal(loaded_solutions.matrix, solutions.matrix)
+    assert list(loaded_validities) == list(validities)
+    assert loaded_totals == totals
+    assert np.array_equal(loaded_counts.table, counts.table)
+    assert loaded_counts.puzzles == counts.puzzles
+
+
+def test_other_settings_are_refused(tmp_path):
+    filename = str(tmp_path / "run_checkpoint.npz")
+    solutions, validities = random_state(1)
+    save_checkpoint(filename, 1, solutions, validities, {}, SETTINGS)
+    with pytest.raises(ValueError):
+        load_checkpoint(filename, dict(SETTINGS, batch=20))
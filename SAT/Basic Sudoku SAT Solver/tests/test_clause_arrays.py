@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+import pytest
+
+from clause_arrays import SolutionMatrix, ClauseSet
+
+
+def random_solutions(rng, count, variables):
+    return [frozenset(x if rng.random() < 0.5 else -x for x in range(1, variables + 1)) for _ in range(count)]
+
+
+def random_clauses(rng, count, variables):
+    return [frozenset(rng.choice((-1, 1)) * rng.randint(1, variables) for _ in range(rng.randint(1, 4)))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("count", [1, 7, 8, 9, 70])
+def test_satisfied_by_all_matches_loops(count):
+    # the solutions are packed eight to a byte, so counts around a multiple of eight matter
+    rng = random.Random(count)
+    solutions = random_solutions(rng, count, 12)
+    clauses = random_clauses(rng, 300, 12)
+    expected = [all(any(literal in solution for literal in clause) for solution in solutions) for clause in clauses]
+    assert SolutionMatrix(solutions).satisfied_by_all(clauses).tolist() == expected
+
+
+def test_update_grows_the_matrix():
+    rng = random.Random(0)
+    solutions = random_solutions(rng, 20, 10)
+    matrix = SolutionMatrix(solutions[:10])
+    matrix.update(solutions[10:])
+    matrix.update([[1, 15]])
+    assert len(matrix) == 21
+    assert matrix.matrix.shape == (21, 16)
+    for row, solution in enumerate(solutions):
+        assert set(np.flatnonzero(matrix.matrix[row]).tolist()) == {x for x in solution if x > 0}
+    # a variable no solution mentions is false in all of them
+    assert matrix.satisfied_by_all([[-30], [30]]).tolist() == [True, False]
+
+
+def test_clause_set_behaves_like_a_set_of_frozensets():
+    rng = random.Random(1)
+    clauses = random_clauses(rng, 500, 30)
+    clause_set = ClauseSet()
+    added = [clause_set.add(clause) for clause in clauses]
+    expected = list(dict.fromkeys(clauses))
+    assert list(clause_set) == expected
+    assert added.count(True) == len(expected) == len(clause_set)
+    assert all(clause in clause_set for clause in clauses)
+    assert frozenset([1, -1, 2, 3, 4, 5]) not in clause_set
+    union = clause_set | [frozenset([100])]
+    assert len(union) == len(clause_set) + 1 and frozenset([100]) not in clause_set
+
+
+@pytest.mark.parametrize("variables", [30, 40000])
+def test_clause_set_array_round_trip(variables):
+    # 40000 widens the literals to int32
+    rng = random.Random(variables)
+    clause_set = ClauseSet(random_clauses(rng, 200, variables))
+    literals, offsets = clause_set.arrays()
+    copy = ClauseSet.from_arrays(literals, offsets)
+    assert list(copy) == list(clause_set)
+    assert copy.lengths().tolist() == [len(clause) for clause in clause_set]
+    padded = clause_set.padded()
+    assert [frozenset(x for x in row if x) for row in padded.tolist()] == list(clause_set)
+    assert SolutionMatrix([[1, 2]]).satisfied_by_all(clause_set).tolist() == \
+        SolutionMatrix([[1, 2]]).satisfied_by_all(list(clause_set)).tolist()
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from clause_library import ClauseLibrary, load_clauses, write_library, library_to_text
+from sudoku_encodings import ClauseBlock
+from sudoku_sat_solver import dimacs_body, open_session, minimal_sudoku_clauses
+
+
+def random_clauses(count, variables, seed=0):
+    rng = random.Random(seed)
+    return [sorted({rng.choice((-1, 1)) * rng.randint(1, variables) for _ in range(rng.randint(1, 4))})
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("variables", [729, 40000])
+def test_write_read_round_trip(tmp_path, variables):
+    # 40000 does not fit into int16, so the library is written with int32 literals
+    clauses = random_clauses(500, variables)
+    filename = str(tmp_path / "random.clauses")
+    write_library(filename, clauses, "minimal")
+    library = ClauseLibrary(filename)
+    try:
+        assert library.encoding == "minimal"
+        assert library.number_of_variables == max(abs(x) for clause in clauses for x in clause)
+        assert list(library) == [frozenset(clause) for clause in clauses]
+    finally:
+        library.close()
+    block = load_clauses(filename, "minimal")
+    assert isinstance(block, ClauseBlock)
+    assert list(block) == clauses
+    assert dimacs_body(block) == dimacs_body(clauses)
+
+
+def test_text_round_trip(tmp_path):
+    clauses = random_clauses(200, 729)
+    library_file = str(tmp_path / "random.clauses")
+    text_file = str(tmp_path / "random.txt")
+    write_library(library_file, clauses)
+    library_to_text(library_file, text_file)
+    assert sorted(map(sorted, load_clauses(text_file))) == sorted(clauses)
+
+
+def test_other_encoding_is_refused(tmp_path):
+    filename = str(tmp_path / "random.clauses")
+    write_library(filename, random_clauses(10, 729), "minimal")
+    with pytest.raises(ValueError):
+        load_clauses(filename, "extended")
+
+
+def test_block_loads_into_session(tmp_path):
+    clauses = [[x] for x in (1, 11, 21)]
+    filename = str(tmp_path / "units.clauses")
+    write_library(filename, clauses)
+    session = open_session(minimal_sudoku_clauses(), "pysat")
+    try:
+        session.add_clauses(load_clauses(filename))
+        satisfied, solution, _ = session.solve([])
+    finally:
+        session.close()
+    assert satisfied
+    assert {1, 11, 21} <= set(solution)
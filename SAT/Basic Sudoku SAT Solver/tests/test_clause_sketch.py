@@ -0,0 +1,73 @@
+import re
+import random
+from collections import Counter
+
+import pytest
+
+from clause_sketch import CountMinSketch
+from sudoku_sat_solver import heuristically_prune, sample_dropped
+
+
+def learnt_per_puzzle(seed, puzzles=200):
+    # a few clauses are learnt often, most only once or twice
+    rng = random.Random(seed)
+    common = [frozenset(rng.sample(range(-300, 300), 3)) for _ in range(30)]
+    for _ in range(puzzles):
+        learnt = set(rng.sample(common, 5))
+        learnt.update(frozenset(rng.sample(range(-300, 300), 4)) for _ in range(20))
+        yield learnt
+
+
+@pytest.mark.parametrize("bits", [4, 8, 18])
+def test_never_counts_too_low(bits):
+    # with 16 counters a row almost every clause collides, the counts may only get too high
+    counts = CountMinSketch(bits=bits)
+    exact = Counter()
+    for learnt in learnt_per_puzzle(bits):
+        counts.update(learnt)
+        exact.update(learnt)
+    clauses = list(exact)
+    estimates = counts.counts(clauses)
+    assert all(estimate >= exact[clause] for clause, estimate in zip(clauses, estimates))
+    if bits == 18:
+        assert estimates.tolist() == [exact[clause] for clause in clauses]
+
+
+@pytest.mark.parametrize("bits", [6, 18])
+def test_prune_keeps_every_clause_learnt_often_enough(bits):
+    counts = CountMinSketch(bits=bits)
+    exact = Counter()
+    for learnt in learnt_per_puzzle(1):
+        counts.update(learnt)
+        counts.puzzles += 1
+        exact.update(learnt)
+    kept, dropped = heuristically_prune(list(exact), counts, 3)
+    assert len(kept) + len(dropped) == len(exact)
+    assert set(clause for clause in exact if exact[clause] >= 3) <= set(kept)
+    if bits == 18:
+        assert set(kept) == set(clause for clause in exact if exact[clause] >= 3)
+
+
+class EvenSession(object):
+    # a clause is "valid" if its smallest literal is even
+    def is_valid(self, clause):
+        return min(clause) % 2 == 0
+
+
+def missed(output):
+    return float(re.search(r"estimated missed validities=([\d.]+)", output).group(1))
+
+
+def test_missed_validities_estimate(capsys):
+    rng = random.Random(0)
+    dropped = list(set(frozenset(rng.sample(range(-300, 300), 3)) for _ in range(400)))
+    valid = [clause for clause in dropped if EvenSession().is_valid(clause)]
+    # a sample of everything is exact
+    assert sample_dropped(dropped, EvenSession(), len(dropped)) == set((clause, 0) for clause in valid)
+    assert missed(capsys.readouterr().out) == pytest.approx(len(valid), abs=0.05)
+    # a sample of a quarter is scaled up to all dropped clauses
+    size = len(dropped) // 4
+    found = sample_dropped(dropped, EvenSession(), size, seed=3)
+    estimate = len(found) * len(dropped) / float(size)
+    assert missed(capsys.readouterr().out) == pytest.approx(estimate, abs=0.05)
+    assert abs(estimate - len(valid)) < 0.25 * len(dropped)
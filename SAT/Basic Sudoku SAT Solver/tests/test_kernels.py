@@ -0,0 +1,40 @@
+import itertools
+
+import pytest
+
+from sudoku_sat_solver import open_session, minimal_sudoku_clauses, minimal_kernel, all_minimal_kernels, v
+
+# v(1, 1, 1) and v(1, 2, 1) cannot both be true, the other literals are padding
+CLAUSES = [
+    [-v(1, 1, 1), -v(1, 2, 1), v(5, 5, 5), -v(9, 9, 2)],
+    [-v(1, 1, 1), -v(1, 2, 1), -v(1, 1, 2), -v(1, 2, 2), v(3, 4, 5)],
+    [-v(2, 2, 7), v(6, 1, 1), -v(7, 7, 7), -v(2, 8, 7), -v(4, 4, 4)],
+]
+
+
+@pytest.fixture(params=["pysat", "cdcl"])
+def session(request):
+    session = open_session(minimal_sudoku_clauses(), request.param)
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize("clause", CLAUSES)
+def test_kernel_is_valid_and_minimal(session, clause):
+    kernel = minimal_kernel(clause, session)
+    assert kernel <= frozenset(clause)
+    assert session.is_valid(kernel)
+    for literal in kernel:
+        assert not session.is_valid(kernel - {literal})
+
+
+def test_invalid_clause_has_no_kernel(session):
+    assert minimal_kernel([v(1, 1, 1), v(2, 2, 2)], session) is None
+
+
+@pytest.mark.parametrize("clause", CLAUSES)
+def test_all_kernels_match_brute_force(session, clause):
+    valid = [frozenset(subset) for size in range(1, len(clause) + 1)
+             for subset in itertools.combinations(clause, size) if session.is_valid(subset)]
+    expected = set(subset for subset in valid if not any(other < subset for other in valid))
+    assert all_minimal_kernels(clause, session) == expected
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from portfolio import Portfolio, parse_portfolio
+from sudoku_sat_solver import read_sudoku, extended_sudoku_clauses
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")) as fileobj:
+    SUDOKUS = [line for line, _ in zip(fileobj, range(4))]
+
+
+def children():
+    """
+    :return: the pids of the processes whose parent is this one, zombies included
+    """
+    found = []
+    for name in os.listdir("/proc"):
+        try:
+            with open(os.path.join("/proc", name, "stat")) as fileobj:
+                # the fields after the command, which is in parentheses: state, parent pid, ...
+                fields = fileobj.read().rsplit(")", 1)[1].split()
+        except (IOError, IndexError):
+            continue
+        if int(fields[1]) == os.getpid():
+            found.append(int(name))
+    return found
+
+
+class Crash(object):
+    # a configuration whose racer dies without an answer
+    def __init__(self, session):
+        self.session = session
+
+    def solve(self, units):
+        os._exit(1)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs /proc")
+@pytest.mark.parametrize("crash", [False, True])
+def test_winner_is_valid_and_no_children_are_left(crash):
+    clauses = extended_sudoku_clauses()
+    before = children()
+    portfolio = Portfolio(parse_portfolio("minimal,efficient,extended"), "pysat")
+    if crash:
+        portfolio.sessions[0] = Crash(portfolio.sessions[0])
+    try:
+        for sudoku in SUDOKUS:
+            name, solution, stats, seconds = portfolio.solve(sudoku)
+            assert name in portfolio.names
+            assert set(clause[0] for clause in read_sudoku(sudoku)) <= solution
+            # whichever encoding won, the grid satisfies all Sudoku rules
+            assert all(any(literal in solution for literal in clause) for clause in clauses)
+            assert children() == before
+    finally:
+        if crash:
+            portfolio.sessions[0] = portfolio.sessions[0].session
+        portfolio.close()
+    assert sum(portfolio.wins.values()) == len(SUDOKUS)
+    if crash:
+        assert portfolio.wins["minimal"] == 0
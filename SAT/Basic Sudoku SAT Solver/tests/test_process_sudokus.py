@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from sudoku_sat_solver import SessionPool, open_session, process_sudokus, minimal_sudoku_clauses
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")) as fileobj:
+    SUDOKUS = [line for line, _ in zip(fileobj, range(20))]
+
+
+@pytest.mark.parametrize("backend", ["pysat", "cdcl"])
+def test_decisions_do_not_depend_on_the_order(backend):
+    session = open_session(minimal_sudoku_clauses(), backend)
+    try:
+        _, forward_solutions, forward = process_sudokus(SUDOKUS, session)
+        _, backward_solutions, backward = process_sudokus(SUDOKUS[::-1], session)
+    finally:
+        session.close()
+    assert forward == backward
+    assert set(forward_solutions) == set(backward_solutions)
+
+
+@pytest.mark.parametrize("backend", ["pysat", "cdcl"])
+def test_totals_do_not_depend_on_the_jobs(backend):
+    totals = []
+    for jobs in (1, 2):
+        session = open_session(minimal_sudoku_clauses(), backend)
+        pool = SessionPool(session, jobs)
+        try:
+            learnt, solutions, decisions = process_sudokus(SUDOKUS, pool)
+        finally:
+            pool.close()
+            session.close()
+        # the learnt clauses of a puzzle come back as a set, whose order changes when it is pickled
+        totals.append((decisions, list(solutions), set(learnt)))
+    assert totals[0] == totals[1]
@@ -0,0 +1,33 @@
+import os
+
+import puzzle_source
+from puzzle_source import PuzzleSource
+
+PUZZLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")
+with open(PUZZLES) as fileobj:
+    LINES = fileobj.readlines()
+
+
+def test_lines_match_the_file():
+    source = PuzzleSource(PUZZLES)
+    try:
+        assert len(source) == len(LINES)
+        assert source.lines(10, 20) == LINES[10:20]
+        assert source.lines(len(LINES) - 2, len(LINES) + 5) == LINES[-2:]
+    finally:
+        source.close()
+
+
+def test_index_is_reused_under_its_own_name(tmp_path, monkeypatch):
+    index_file = str(tmp_path / "input.idx")
+    PuzzleSource(PUZZLES, index_file).close()
+    assert os.listdir(str(tmp_path)) == ["input.idx"]
+
+    def no_scan(data):
+        raise AssertionError("the index was built again")
+    monkeypatch.setattr(puzzle_source, "line_offsets", no_scan)
+    source = PuzzleSource(PUZZLES, index_file)
+    try:
+        assert source.lines(0, 1) == LINES[:1]
+    finally:
+        source.close()
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from sudoku_sat_solver import read_sudoku, open_session, minimal_sudoku_clauses
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")) as fileobj:
+    PUZZLE = fileobj.readline().strip()
+
+
+def test_givens():
+    units = read_sudoku(PUZZLE + "\n")
+    assert len(units) == sum(1 for c in PUZZLE if c != "0")
+    assert all(1 <= clause[0] <= 729 for clause in units)
+
+
+def test_crlf_line_is_read_like_lf():
+    assert read_sudoku(PUZZLE + "\r\n") == read_sudoku(PUZZLE + "\n")
+    session = open_session(minimal_sudoku_clauses(), "pysat")
+    try:
+        satisfied, _, _ = session.solve([clause[0] for clause in read_sudoku(PUZZLE + "\r\n")])
+    finally:
+        session.close()
+    assert satisfied
+
+
+@pytest.mark.parametrize("line", [PUZZLE[:-1] + ".", PUZZLE[:-1] + "x", PUZZLE + " "])
+def test_invalid_characters_are_rejected(line):
+    with pytest.raises(ValueError):
+        read_sudoku(line)
@@ -0,0 +1,40 @@
+import os
+
+import benchmark
+from clause_library import load_clauses
+from select_validities import Evaluator, validity_groups, select
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def evaluator(jobs=1):
+    validities = [frozenset(clause) for clause in
+                  load_clauses(os.path.join(HERE, "10000_15000_minimal_batch_size_50_validities.txt"))]
+    groups = validity_groups("minimal", validities)
+    sample = benchmark.sample_puzzles(os.path.join(HERE, "small_input.txt"), 6, seed=2)
+    return Evaluator("minimal", groups, sample[::-1], "pysat", jobs=jobs), sorted(groups)
+
+
+def test_scores_do_not_depend_on_the_evaluation_order():
+    evaluate, names = evaluator()
+    subsets = [[], names[:1], names]
+    assert evaluate(subsets) == evaluate(subsets[::-1])[::-1]
+    assert evaluate([names[:1]] * 2) == evaluate([names[:1]])[0:1] * 2
+
+
+def test_parallel_scores_match_serial_ones():
+    serial, names = evaluator()
+    parallel, _ = evaluator(jobs=2)
+    try:
+        subsets = [[], names]
+        assert parallel(subsets) == serial(subsets)
+    finally:
+        parallel.close()
+
+
+def test_selection_never_scores_worse_than_the_start():
+    evaluate, names = evaluator()
+    selected, best = select(names, evaluate, forward=True)
+    assert best <= evaluate([[]])[0]
+    selected, best = select(names, evaluate, forward=False)
+    assert best <= evaluate([names])[0]
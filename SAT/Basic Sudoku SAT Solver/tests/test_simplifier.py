@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from sudoku_sat_solver import (Simplifier, open_session, read_sudoku, minimal_sudoku_clauses,
+                               extended_sudoku_clauses)
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "small_input.txt")) as fileobj:
+    SUDOKUS = [line for line, _ in zip(fileobj, range(5))]
+
+
+@pytest.mark.parametrize("encoding", [minimal_sudoku_clauses, extended_sudoku_clauses])
+@pytest.mark.parametrize("backend", ["pysat", "cdcl"])
+def test_models_match_the_plain_solve(encoding, backend):
+    clauses = encoding()
+    plain = open_session(clauses, backend)
+    simplified = open_session(clauses, backend, simplify=True)
+    try:
+        for sudoku in SUDOKUS:
+            units = [clause[0] for clause in read_sudoku(sudoku)]
+            satisfied, solution, _ = simplified.solve(units)
+            assert satisfied
+            # the puzzles have one solution, so both models are the same
+            assert solution == plain.solve(units)[1]
+            assert set(units) <= solution
+            assert all(any(literal in solution for literal in clause) for clause in clauses)
+    finally:
+        plain.close()
+        simplified.close()
+
+
+def test_givens_survive_the_renumbering():
+    clauses = minimal_sudoku_clauses()
+    units = [clause[0] for clause in read_sudoku(SUDOKUS[0])]
+    residual, variables, fixed = Simplifier(clauses).simplify(units)
+    assert set(units) <= set(fixed)
+    # the residual formula only has the variables propagation left open
+    assert not set(abs(literal) for literal in fixed) & set(variables[1:])
+    assert sorted(set(abs(literal) for clause in residual for literal in clause)) == list(range(1, len(variables)))
+
+
+def test_conflicting_givens_are_unsat():
+    session = open_session(minimal_sudoku_clauses(), "pysat", simplify=True)
+    try:
+        # digit 1 twice in the first row
+        satisfied, solution, _ = session.solve([1, 10])
+    finally:
+        session.close()
+    assert not satisfied and not solution
@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import signal
+import socket
+import subprocess
+
+import pytest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(HERE, "small_input.txt")) as fileobj:
+    SUDOKUS = [fileobj.readline().strip() for _ in range(2)]
+
+
+def check_reply(sudoku, reply):
+    digits, fields = reply.split(" ", 1)
+    assert len(digits) == 81 and "decisions=" in fields and "ms=" in fields
+    assert all(given == "0" or given == digit for given, digit in zip(sudoku, digits))
+    grid = [digits[9 * row:9 * row + 9] for row in range(9)]
+    groups = grid + ["".join(row[column] for row in grid) for column in range(9)]
+    groups += ["".join(grid[3 * (k // 3) + r][3 * (k % 3) + c] for r in range(3) for c in range(3)) for k in range(9)]
+    assert all(sorted(group) == list("123456789") for group in groups)
+
+
+def service(*options):
+    return subprocess.Popen([sys.executable, "sudoku_sat_solver.py", "--serve", "-s", "pysat"] + list(options),
+                            cwd=HERE, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+
+
+def test_stream_replies():
+    process = service()
+    out, err = process.communicate("\n".join(SUDOKUS + ["12x"]) + "\n", timeout=120)
+    assert process.returncode == 0
+    replies = out.splitlines()
+    # nothing but the answers on stdout, the status lines go to stderr
+    assert len(replies) == 3
+    for sudoku, reply in zip(SUDOKUS, replies):
+        check_reply(sudoku, reply)
+    assert replies[2].startswith("error ")
+    # the request with an error is not counted
+    assert "served=2" in err
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_socket_replies(tmp_path):
+    path = str(tmp_path / "sudoku.sock")
+    process = service("--socket", path)
+    try:
+        deadline = time.time() + 60
+        while not os.path.exists(path):
+            assert process.poll() is None and time.time() < deadline
+            time.sleep(0.05)
+        for sudoku in SUDOKUS:
+            # a connection per puzzle, and two puzzles on one connection
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(path)
+                client.sendall((sudoku + "\n").encode())
+                client.shutdown(socket.SHUT_WR)
+                check_reply(sudoku, client.makefile().read().strip())
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(("\n".join(SUDOKUS[::-1]) + "\n").encode())
+            client.shutdown(socket.SHUT_WR)
+            replies = client.makefile().read().splitlines()
+        assert len(replies) == 2
+        for sudoku, reply in zip(SUDOKUS[::-1], replies):
+            check_reply(sudoku, reply)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        _, err = process.communicate(timeout=60)
+    assert process.returncode == 0
+    assert not os.path.exists(path)
+    assert "served=4" in err
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from sudoku_sat_solver import SubsumptionIndex, extended_sudoku_clauses_with_cats
+
+
+def full_scan(base_clauses_with_cats, clause):
+    return [(key, baseclause) for key in base_clauses_with_cats for baseclause in base_clauses_with_cats[key]
+            if baseclause.issubset(clause)]
+
+
+def random_clause(rng, variables, length):
+    return frozenset(rng.choice((-1, 1)) * x for x in rng.sample(range(1, variables + 1), length))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_the_full_scan(seed):
+    rng = random.Random(seed)
+    base = dict((key, [random_clause(rng, 12, rng.randint(1, 3)) for _ in range(rng.randint(0, 20))])
+                for key in ("vcell", "urow", "ublock"))
+    index = SubsumptionIndex(base)
+    for _ in range(200):
+        clause = random_clause(rng, 12, rng.randint(1, 8))
+        expected = full_scan(base, clause)
+        assert index.subsets(clause) == expected
+        assert index.first_subset(clause) == (expected[0] if expected else None)
+
+
+def test_matches_the_full_scan_on_the_encoding():
+    rng = random.Random(0)
+    base = extended_sudoku_clauses_with_cats()
+    index = SubsumptionIndex(base)
+    clauses = [random_clause(rng, 729, 4) for _ in range(100)]
+    # supersets of base clauses, so that there are matches to find
+    clauses += [frozenset(baseclause) | random_clause(rng, 729, 2)
+                for key in base for baseclause in rng.sample(list(base[key]), 3)]
+    for clause in clauses:
+        expected = full_scan(base, clause)
+        assert index.subsets(clause) == expected
+        assert index.first_subset(clause) == (expected[0] if expected else None)
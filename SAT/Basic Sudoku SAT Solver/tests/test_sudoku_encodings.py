@@ -0,0 +1,25 @@
+import pytest
+
+import sudoku_encodings
+from sudoku_sat_solver import minimal_sudoku_clauses, sudoku_clauses, extended_sudoku_clauses, v, v_inv
+
+
+@pytest.mark.parametrize("generator, reference", [
+    (sudoku_encodings.minimal_clauses, minimal_sudoku_clauses),
+    (sudoku_encodings.efficient_clauses, sudoku_clauses),
+    (sudoku_encodings.extended_clauses, extended_sudoku_clauses),
+])
+def test_order_three_reproduces_the_generators(generator, reference):
+    assert list(generator(3)) == [list(clause) for clause in reference()]
+
+
+def test_variables_match_for_order_three():
+    for variable in (1, 82, 400, 729):
+        assert sudoku_encodings.v_inv(variable) == v_inv(variable)
+        assert sudoku_encodings.v(*v_inv(variable)) == v(*v_inv(variable)) == variable
+
+
+def test_order_four_counts():
+    # 16x16: 256 cells with 16 digits, 120 pairs of cells in a group
+    assert sudoku_encodings.minimal_clauses(4).number_of_variables == 16 ** 3
+    assert len(sudoku_encodings.extended_clauses(4)) == 256 * (1 + 120) + 3 * 256 * 120 + 3 * 256
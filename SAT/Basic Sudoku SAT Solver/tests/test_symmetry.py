@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from sudoku_encodings import v, v_inv
+from sudoku_symmetry import canonical, symmetry_moving, OrbitCache
+
+
+def random_line_permutation(rng):
+    # bands (or stacks) are permuted, and the rows (or columns) within each of them
+    bands = rng.sample(range(3), 3)
+    images = []
+    for band in bands:
+        images.extend(3 * band + row for row in rng.sample(range(3), 3))
+    return images
+
+
+def random_symmetry(rng):
+    rows, columns = random_line_permutation(rng), random_line_permutation(rng)
+    digits = rng.sample(range(9), 9)
+    transpose = rng.random() < 0.5
+
+    def apply(literal):
+        i, j, d = v_inv(abs(literal))
+        i, j = rows[i - 1], columns[j - 1]
+        if transpose:
+            i, j = j, i
+        image = v(i + 1, j + 1, digits[d - 1] + 1)
+        return image if literal > 0 else -image
+    return apply
+
+
+def random_clause(rng):
+    return frozenset(rng.choice((-1, 1)) * rng.randint(1, 729) for _ in range(rng.randint(1, 4)))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_canonical_is_invariant_under_symmetries(seed):
+    rng = random.Random(seed)
+    clause = random_clause(rng)
+    form = canonical(clause)
+    assert len(form) == len(clause)
+    assert canonical(form) == form
+    for _ in range(5):
+        symmetry = random_symmetry(rng)
+        assert canonical(symmetry(literal) for literal in clause) == form
+
+
+def test_other_variables_are_left_alone():
+    assert canonical([1, 730]) == frozenset([1, 730])
+
+
+@pytest.mark.parametrize("variable", [1, 81, 365, 729])
+def test_symmetry_moving(variable):
+    symmetry = symmetry_moving(variable)
+    assert symmetry(1) == variable
+    assert symmetry(-1) == -variable
+    assert sorted(abs(symmetry(x)) for x in range(1, 730)) == list(range(1, 730))
+
+
+def test_orbit_cache_answers_for_images():
+    rng = random.Random(0)
+    orbits = OrbitCache()
+    clause = random_clause(rng)
+    orbits.add(clause, True)
+    symmetry = random_symmetry(rng)
+    image = frozenset(symmetry(literal) for literal in clause)
+    assert orbits.get(image) is True
+    assert len(orbits.representatives([clause, image])) == 1
@@ -0,0 +1,72 @@
+import os
+import time
+
+import training_pipeline
+from training_pipeline import SolverSlots, solve_and_check
+from clause_arrays import SolutionMatrix
+from metrics import METRICS
+from sudoku_sat_solver import (SubsumptionIndex, open_session, process_sudokus, minimal_sudoku_clauses,
+                               minimal_sudoku_clauses_with_cats)
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_solving_goes_on_while_a_check_runs(monkeypatch):
+    with open(os.path.join(HERE, "small_input.txt")) as fileobj:
+        sudokus = [line for line, _ in zip(fileobj, range(12))]
+    slots = SolverSlots("cdcl", minimal_sudoku_clauses(), 1)
+    solved = []
+    session = slots.sessions[0]
+    solve = session.solve_fresh
+
+    def counting_solve(units):
+        result = solve(units)
+        solved.append(units)
+        return result
+
+    session.solve_fresh = counting_solve
+    progress = []
+
+    def slow_check(learnt, base_clauses, session=None, orbits=None, cache=None):
+        # the first check waits for two more puzzles; one may already have been on the solver, the
+        # second one can only be started by the event loop while the check runs
+        if not progress:
+            before = len(solved)
+            deadline = time.time() + 10
+            while len(solved) < before + 2 and time.time() < deadline:
+                time.sleep(0.01)
+            progress.append(len(solved) - before)
+        return set()
+
+    monkeypatch.setattr(training_pipeline, "check_validity", slow_check)
+    try:
+        result = solve_and_check(sudokus, slots, SolutionMatrix(),
+                                 SubsumptionIndex(minimal_sudoku_clauses_with_cats()), minimal_sudoku_clauses(), None)
+    finally:
+        slots.close()
+    assert result["puzzles"] == len(sudokus)
+    assert progress and progress[0] >= 2
+
+
+def test_metrics_match_process_sudokus(monkeypatch):
+    with open(os.path.join(HERE, "small_input.txt")) as fileobj:
+        sudokus = [line for line, _ in zip(fileobj, range(6))]
+    keys = ("calls.solve", "process_sudokus.learnt", "process_sudokus.decisions")
+    monkeypatch.setattr(training_pipeline, "check_validity", lambda *args: set())
+
+    monkeypatch.setattr(METRICS, "counters", {})
+    session = open_session(minimal_sudoku_clauses(), "cdcl")
+    try:
+        process_sudokus(sudokus, session)
+    finally:
+        session.close()
+    sequential = dict((key, METRICS.counters[key]) for key in keys)
+
+    monkeypatch.setattr(METRICS, "counters", {})
+    slots = SolverSlots("cdcl", minimal_sudoku_clauses(), 2)
+    try:
+        solve_and_check(sudokus, slots, SolutionMatrix(), SubsumptionIndex(minimal_sudoku_clauses_with_cats()),
+                        minimal_sudoku_clauses(), None)
+    finally:
+        slots.close()
+    assert dict((key, METRICS.counters[key]) for key in keys) == sequential
@@ -0,0 +1,65 @@
+from validity_cache import ValidityCache, encoding_fingerprint
+from sudoku_symmetry import OrbitCache
+from sudoku_sat_solver import minimal_sudoku_clauses, extended_sudoku_clauses
+
+MINIMAL = encoding_fingerprint(minimal_sudoku_clauses())
+
+
+def test_verdicts_survive_a_reopen(tmp_path):
+    filename = str(tmp_path / "validities.db")
+    cache = ValidityCache(filename, MINIMAL)
+    cache.add([-1, -10], True)
+    cache.add([1, 2], False)
+    assert len(cache) == 2
+    cache.close()
+    cache = ValidityCache(filename, MINIMAL)
+    try:
+        # literal order does not matter
+        assert cache.get([-10, -1]) is True
+        assert cache.get([2, 1]) is False
+        assert cache.get([3]) is None
+        assert (cache.hits, cache.misses) == (2, 1)
+    finally:
+        cache.close()
+
+
+def test_lru_answers_before_the_flush(tmp_path):
+    cache = ValidityCache(str(tmp_path / "validities.db"), MINIMAL, size=2)
+    try:
+        cache.add([-1, -10], True)
+        # not written yet, so the verdict can only come from memory
+        assert cache.get([-1, -10]) is True
+        cache.add([1, 2], False)
+        cache.add([3, 4], False)
+        cache.flush()
+        # evicted from the LRU of two, read back from the file
+        assert len(cache._lru) == 2 and "-10 -1" not in cache._lru
+        assert cache.get([-1, -10]) is True
+    finally:
+        cache.close()
+
+
+def test_other_encoding_does_not_see_the_verdicts(tmp_path):
+    filename = str(tmp_path / "validities.db")
+    cache = ValidityCache(filename, MINIMAL)
+    cache.add([-1, -10], True)
+    cache.close()
+    extended = encoding_fingerprint(extended_sudoku_clauses())
+    assert extended != MINIMAL
+    assert encoding_fingerprint(reversed(minimal_sudoku_clauses())) == MINIMAL
+    cache = ValidityCache(filename, extended)
+    try:
+        assert cache.get([-1, -10]) is None
+        assert len(cache) == 0
+    finally:
+        cache.close()
+
+
+def test_canonical_key_answers_for_images(tmp_path):
+    cache = ValidityCache(str(tmp_path / "validities.db"), MINIMAL, canonical=OrbitCache().key)
+    try:
+        # digit 1 twice in the first row, and digit 2 twice in the second
+        cache.add([-1, -10], True)
+        assert cache.get([-83, -92]) is True
+    finally:
+        cache.close()
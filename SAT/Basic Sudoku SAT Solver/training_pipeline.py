@@ -0,0 +1,170 @@
+"""
+training_pipeline.py
+
+The solve, prune and check steps of one training batch as a pipeline. In the batch-synchronous loop of
+sudoku_sat_solver.main the puzzles of a batch are all solved before the first learnt clause is pruned,
+and the validity checks only start after that. Here the puzzles are solved on a set of solver slots
+while the clauses learnt on the puzzles already solved are pruned and checked:
+
+    produce --(solved queue)--> prune --(candidate queue)--> check
+
+With the minisat backend every solver run is an asyncio subprocess, other backends solve in a thread.
+Pruning and checking run in threads of their own as well: the event loop has to stay free to feed the
+queries, which are larger than a pipe buffer, to the minisat processes and to start the next puzzles.
+The queues are bounded, so solving stops once the pruning and checking fall behind.
+
+Only the solving overlaps with the rest: the validities of a batch are still added to the base formula
+before the next batch starts, exactly as in the batch-synchronous loop. Learnt clauses are pruned as the
+puzzles finish, so the known solutions used to rule out invalid clauses are those of the puzzles solved
+so far rather than the whole batch. A clause that a later puzzle of the batch would have ruled out is
+found invalid by the solver instead, which costs a call but gives the same validities.
+"""
+
+import asyncio
+import shutil
+import tempfile
+import collections
+from subprocess import PIPE
+
+from clause_arrays import ClauseSet
+from metrics import METRICS
+from sudoku_sat_solver import (COMMAND, open_session, read_results, read_statistics,
+                               read_sudoku, logically_prune, check_validity)
+
+
+class SolverSlots(object):
+    """
+    jobs solver sessions for the puzzles, each with its own scratch directory, so that solver runs do
+    not share result and log files.
+    """
+
+    def __init__(self, backend, clauses, jobs, simplify=False):
+        self.workdirs = [tempfile.mkdtemp(prefix="sudoku_slot_") for _ in range(max(1, jobs))]
+        self.sessions = [open_session(clauses, backend, workdir=workdir, simplify=simplify)
+                         for workdir in self.workdirs]
+
+    def add_clauses(self, clauses):
+        clauses = list(clauses)
+        for session in self.sessions:
+            session.add_clauses(clauses)
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+        for workdir in self.workdirs:
+            shutil.rmtree(workdir, True)
+
+
+async def solve_in_slot(sudoku, slots):
+    """
+    :return: the solution, the learnt clauses and the number of decisions, as solve_sudoku
+    """
+    session = await slots.get()
+    try:
+        units = [clause[0] for clause in read_sudoku(sudoku)]
+        if session.backend == "minisat" and not session.simplify:
+            command = COMMAND % ("/dev/stdin", session.output_file, session.logfile)
+            process = await asyncio.create_subprocess_shell(command, stdin=PIPE)
+            await process.communicate(session.dimacs(units))
+            satisfied, solution, learnt = read_results(process.returncode, session.output_file, session.logfile)
+            stats = read_statistics(session.logfile)
+        else:
+            # a fresh solver per puzzle, as solve_sudoku
+            loop = asyncio.get_running_loop()
+            satisfied, solution, learnt = await loop.run_in_executor(None, session.solve_fresh, units)
+            stats = session.stats
+    finally:
+        slots.put_nowait(session)
+    METRICS.count("calls.solve")
+    if not satisfied:
+        raise Exception("All sudokus should be satisfiable")
+    return solution, learnt, stats.get("decisions", 0)
+
+
+async def _produce(sudokus, slots, jobs, solved):
+    # at most jobs puzzles are solved at once, and they are handed on in the order of the batch
+    pending = collections.deque()
+    for sudoku in sudokus:
+        pending.append(asyncio.ensure_future(solve_in_slot(sudoku, slots)))
+        if len(pending) >= jobs:
+            await solved.put(await pending.popleft())
+    while pending:
+        await solved.put(await pending.popleft())
+    await solved.put(None)
+
+
+async def _prune(solved, candidates, solutions, base_clauses_with_cats, result):
+    learnt_clauses = ClauseSet()
+    done = False
+    while not done:
+        # everything solved by now is pruned together
+        chunk = [await solved.get()]
+        while not solved.empty():
+            chunk.append(solved.get_nowait())
+        if chunk[-1] is None:
+            chunk.pop()
+            done = True
+        new_clauses = []
+        for solution, learnt, decisions in chunk:
+            solutions.update([solution])
+            new_clauses.extend(clause for clause in learnt if learnt_clauses.add(clause))
+            result["puzzles"] += 1
+            result["decisions"] += decisions
+        if new_clauses:
+            # solutions is only updated by this coroutine, so the thread has it to itself
+            loop = asyncio.get_running_loop()
+            valid_clauses, need_processing = await loop.run_in_executor(None, logically_prune, new_clauses,
+                                                                        solutions, base_clauses_with_cats)
+            result["valid_clauses"].update(valid_clauses)
+            result["checked"] += len(need_processing)
+            if len(need_processing):
+                await candidates.put(need_processing)
+    result["learnt"] = len(learnt_clauses)
+    # the same counters as process_sudokus
+    METRICS.count("process_sudokus.learnt", result["learnt"])
+    METRICS.count("process_sudokus.decisions", result["decisions"])
+    await candidates.put(None)
+
+
+async def _check(candidates, base_clauses, session, orbits, cache, result):
+    loop = asyncio.get_running_loop()
+    while True:
+        need_processing = await candidates.get()
+        if need_processing is None:
+            return
+        # one check at a time, the session and the cache are not shared with another thread meanwhile
+        valid_clauses = await loop.run_in_executor(None, check_validity, need_processing, base_clauses, session,
+                                                   orbits, cache)
+        result["valid_clauses"].update(valid_clauses)
+
+
+async def _pipeline(sudokus, slots, jobs, solutions, base_clauses_with_cats, base_clauses, session, orbits, cache):
+    free = asyncio.Queue()
+    for slot in slots.sessions:
+        free.put_nowait(slot)
+    solved = asyncio.Queue(maxsize=2 * jobs)
+    candidates = asyncio.Queue(maxsize=2)
+    result = {"valid_clauses": set(), "puzzles": 0, "decisions": 0, "learnt": 0, "checked": 0}
+    await asyncio.gather(_produce(sudokus, free, jobs, solved),
+                         _prune(solved, candidates, solutions, base_clauses_with_cats, result),
+                         _check(candidates, base_clauses, session, orbits, cache, result))
+    return result
+
+
+def solve_and_check(sudokus, slots, solutions, base_clauses_with_cats, base_clauses, session, orbits=None,
+                    cache=None):
+    """
+    Solves a batch of puzzles and checks the validity of the clauses learnt on them.
+
+    :param slots: SolverSlots for the puzzles
+    :param solutions: the SolutionMatrix of known solutions, the new solutions are added to it
+    :param session: the session or SessionPool for the validity checks
+    :return: dict with the valid clauses, as the (clause, base clause or 0) pairs that logically_prune and
+             check_validity return, and the counts puzzles, decisions, learnt and checked
+    """
+    jobs = len(slots.sessions)
+    if hasattr(session, "start"):
+        # the workers of a SessionPool have to be forked before any solver subprocess holds a pipe
+        session.start()
+    return asyncio.run(_pipeline(list(sudokus), slots, jobs, solutions, base_clauses_with_cats, base_clauses,
+                                 session, orbits, cache))
@@ -0,0 +1,104 @@
+"""
+validity_cache.py
+
+Verdicts of the validity oracle (is a clause implied by the encoding?) kept across runs. Valid and
+invalid clauses are stored in an SQLite file, keyed by a fingerprint of the encoding's clauses and
+the clause itself, so that repeated or overlapping training runs only send new clauses to the solver.
+A bounded in-memory LRU sits in front of the file, and new verdicts are written in one transaction
+per flush() rather than one per clause.
+
+Adding learnt validities to the formula does not change which clauses it implies, so verdicts stay
+correct while a training run grows the base formula; only the encoding has to match.
+"""
+
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+# verdicts kept in memory
+LRU_SIZE = 100000
+
+
+def clause_text(clause):
+    return " ".join(str(literal) for literal in sorted(clause))
+
+
+def encoding_fingerprint(clauses):
+    """
+    :param clauses: iterable of clauses
+    :return: hex digest that does not depend on the order of the clauses or of their literals
+    """
+    digest = hashlib.sha1()
+    for line in sorted(clause_text(clause) for clause in clauses):
+        digest.update(line.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class ValidityCache(object):
+    """
+    get() returns True, False or None if the clause was never decided; add() records a verdict.
+
+    :param canonical: optional function mapping a clause to the member of its class that is stored,
+                      e.g. OrbitCache.key, so that one verdict answers for all equivalent clauses
+    """
+
+    def __init__(self, filename, fingerprint, canonical=None, size=LRU_SIZE):
+        self.fingerprint = fingerprint
+        self.canonical = canonical
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._pending = []
+        # the training pipeline checks validities on a worker thread, one check at a time
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS verdicts (encoding TEXT, clause TEXT, valid INTEGER, "
+                                 "PRIMARY KEY (encoding, clause)) WITHOUT ROWID")
+
+    def __len__(self):
+        query = "SELECT COUNT(*) FROM verdicts WHERE encoding = ?"
+        return self._connection.execute(query, (self.fingerprint,)).fetchone()[0] + len(self._pending)
+
+    def _key(self, clause):
+        if self.canonical is not None:
+            clause = self.canonical(clause)
+        return clause_text(clause)
+
+    def _remember(self, key, verdict):
+        self._lru[key] = verdict
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+
+    def get(self, clause):
+        key = self._key(clause)
+        verdict = self._lru.get(key)
+        if verdict is None:
+            query = "SELECT valid FROM verdicts WHERE encoding = ? AND clause = ?"
+            row = self._connection.execute(query, (self.fingerprint, key)).fetchone()
+            if row is not None:
+                verdict = bool(row[0])
+        if verdict is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, verdict)
+        return verdict
+
+    def add(self, clause, verdict):
+        key = self._key(clause)
+        if self._lru.get(key) == verdict:
+            return
+        self._remember(key, verdict)
+        self._pending.append((self.fingerprint, key, int(verdict)))
+
+    def flush(self):
+        if self._pending:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?)", self._pending)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self._connection.close()